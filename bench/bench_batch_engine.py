@@ -0,0 +1,58 @@
+# d:/game/puzzle/bench/bench_batch_engine.py
+# BatchEngine のスループット計測
+# 10x15 のマップで同じ配置の塊を PackedEngine (1配置ずつ) と BatchEngine (一括) で判定して比べる
+# RELEVANT FILES: src/game/batch_engine.py, src/game/engine.py, src/game/solver.py
+
+import argparse
+import itertools
+import time
+
+from bench.bench_parallel_solve import make_map
+from src.game.batch_engine import BatchEngine
+from src.game.solver import Solver
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BatchEngine と PackedEngine の比較")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    map_data = make_map(args.seed)
+    templates = [{"direction": d} for d in ("up", "down", "left", "right")]
+    solver = Solver(map_data, templates)
+    piece_candidates = solver._prepare_search()
+    placements = solver._iter_placements(range(len(piece_candidates[0])), prune=False)
+    chunk = [
+        [solver.compiled.pack(x, y, t["direction"]) for (x, y), t in zip(p, templates)]
+        for p in itertools.islice(placements, args.chunk_size)
+    ]
+    batch_engine = BatchEngine(solver.compiled, solver.max_steps)
+
+    packed_time = batch_time = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        expected = [solver.engine.run(placement) for placement in chunk]
+        elapsed = time.perf_counter() - start
+        packed_time = elapsed if packed_time is None else min(packed_time, elapsed)
+
+        start = time.perf_counter()
+        wins = batch_engine.run(chunk).tolist()
+        elapsed = time.perf_counter() - start
+        batch_time = elapsed if batch_time is None else min(batch_time, elapsed)
+
+    if wins != expected:
+        raise SystemExit("BatchEngine の結果が PackedEngine と一致しません")
+
+    n = len(chunk)
+    print(f"placements={n} wins={sum(wins)}")
+    print(f"packed={packed_time * 1000:8.1f} ms ({n / packed_time:10.0f} /s)")
+    print(
+        f"batch ={batch_time * 1000:8.1f} ms ({n / batch_time:10.0f} /s) "
+        f"speedup={packed_time / batch_time:5.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
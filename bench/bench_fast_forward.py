@@ -0,0 +1,84 @@
+# d:/game/puzzle/bench/bench_fast_forward.py
+# Simulator.fast_forward の計測
+# 公式ステージの正解配置と長い通路のマップで、step と fast_forward のループ回数・時間・結果を比べる
+# RELEVANT FILES: src/game/simulator.py, src/game/compiled_map.py, src/game/loader.py
+
+import argparse
+import copy
+import time
+
+from src.game.compiled_map import CompiledMap
+from src.game.loader import StageLoader
+from src.game.simulator import Simulator
+
+
+def answer_players(stage):
+    return [
+        {
+            "grid_x": p["answer"]["x"],
+            "grid_y": p["answer"]["y"],
+            "piece": {"direction": p["direction"]},
+        }
+        for p in stage["players"]
+    ]
+
+
+def corridor_stage(length, count):
+    """1人1行の長い通路の先にゴールがあるマップ"""
+    map_data = [["00200"] * length + ["00300"] for _ in range(count)]
+    players = [
+        {"grid_x": 0, "grid_y": y, "piece": {"direction": "right"}}
+        for y in range(count)
+    ]
+    return map_data, players
+
+
+def measure(compiled, players, advance, max_steps):
+    """決着まで進め、(ループ回数, 経過時間, status, ステップ数, 最終座標) を返す"""
+    sim = Simulator(compiled.map_data, copy.deepcopy(players), compiled=compiled)
+    iterations = 0
+    start = time.perf_counter()
+    while sim.status == "CONTINUE" and sim.steps < max_steps:
+        advance(sim)
+        iterations += 1
+    elapsed = time.perf_counter() - start
+    return iterations, elapsed, sim.status, sim.steps, sim.players
+
+
+def main():
+    parser = argparse.ArgumentParser(description="step と fast_forward の比較")
+    parser.add_argument("--stages-dir", default="stages")
+    parser.add_argument("--corridor", type=int, default=500)
+    parser.add_argument("--max-steps", type=int, default=10000)
+    args = parser.parse_args()
+
+    loader = StageLoader(args.stages_dir)
+    cases = []
+    for level in loader.get_available_levels():
+        stage = loader.load_stage(level)
+        cases.append((f"level {level}", stage["map_data"], answer_players(stage)))
+    for count in (1, 4, 16):
+        map_data, players = corridor_stage(args.corridor, count)
+        cases.append((f"corridor {args.corridor}x{count}", map_data, players))
+
+    for name, map_data, players in cases:
+        # 直進ステップ数の表はマップごとに1回だけ作る (計測からは除く)
+        compiled = CompiledMap(map_data)
+        start = time.perf_counter()
+        compiled.straight_runs()
+        prepare = time.perf_counter() - start
+
+        stepwise = measure(compiled, players, Simulator.step, args.max_steps)
+        jumping = measure(compiled, players, Simulator.fast_forward, args.max_steps)
+        if stepwise[2:] != jumping[2:]:
+            raise SystemExit(f"{name}: fast_forward の結果が step と一致しません")
+        print(
+            f"{name:18s} {jumping[2]:4s} steps={stepwise[3]:5d} "
+            f"loops={stepwise[0]:5d} -> {jumping[0]:5d} "
+            f"time={stepwise[1] * 1000:7.2f} -> {jumping[1] * 1000:7.2f} ms "
+            f"(prepare {prepare * 1000:.2f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
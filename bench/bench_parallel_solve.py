@@ -0,0 +1,56 @@
+# d:/game/puzzle/bench/bench_parallel_solve.py
+# Solver.solve の並列探索ベンチマーク
+# ワーカー数を 1 から N まで変えて探索時間を計測し、結果が逐次探索と一致することも確認する
+# RELEVANT FILES: src/game/solver.py
+
+import argparse
+import os
+import random
+import time
+
+from src.game.solver import Solver
+
+
+def make_map(seed, rows=10, cols=15):
+    """矢印とゴールを散らした 10x15 の検証用マップを生成する"""
+    rng = random.Random(seed)
+    tiles = ["00200"] * 10 + ["00400", "00500", "00600", "00700", "00300"]
+    return [[rng.choice(tiles) for _ in range(cols)] for _ in range(rows)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solver の並列スケーリング計測")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--limit", type=int, default=10**9)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    map_data = make_map(args.seed)
+    templates = [{"direction": d} for d in ("up", "down", "left", "right")]
+
+    baseline = None
+    base_time = None
+    for workers in range(1, args.max_workers + 1):
+        best = None
+        for _ in range(args.repeat):
+            solver = Solver(map_data, templates)
+            start = time.perf_counter()
+            solutions = solver.solve(args.limit, workers=workers)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        if baseline is None:
+            baseline = solutions
+            base_time = best
+        elif solutions != baseline:
+            raise SystemExit(f"workers={workers}: 結果が逐次探索と一致しません")
+
+        print(
+            f"workers={workers:2d} solutions={len(solutions)} "
+            f"time={best * 1000:8.1f} ms speedup={base_time / best:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# d:/game/puzzle/bench/bench_simulator_collisions.py
+# Simulator.step の衝突判定スケーリング計測
+# 2〜500人の配置で、占有グリッド版の step と全ペア比較の参照実装の結果・時間を比べる
+# RELEVANT FILES: src/game/simulator.py, src/game/compiled_map.py
+
+import argparse
+import copy
+import random
+import time
+
+from src.game.compiled_map import DIRECTIONS, DIR_DELTAS
+from src.game.simulator import Simulator
+
+PLAYER_COUNTS = (2, 10, 50, 100, 200, 500)
+
+
+def reference_step(sim):
+    """全ペアを比較する以前の Simulator.step と同じ判定 (比較用)"""
+    if sim.status != "CONTINUE":
+        return sim.status
+
+    transitions = sim.compiled.transitions
+    cols = sim.cols
+    status = "CONTINUE"
+    new_states = []
+    new_positions = []
+    for state in sim.states:
+        next_state = transitions[state]
+        if next_state < 0:
+            cell = state >> 3
+            dx, dy = DIR_DELTAS[(state >> 1) & 3]
+            new_positions.append((cell % cols + dx, cell // cols + dy))
+            status = "LOSE"
+            next_state = state & ~1
+        else:
+            cell = next_state >> 3
+            new_positions.append((cell % cols, cell // cols))
+        new_states.append(next_state)
+
+    pos_counts = {}
+    for pos in new_positions:
+        pos_counts[pos] = pos_counts.get(pos, 0) + 1
+    if any(count > 1 for count in pos_counts.values()):
+        status = "LOSE"
+
+    for i, p in enumerate(sim.players):
+        old_pos = (p["grid_x"], p["grid_y"])
+        for j, other in enumerate(sim.players):
+            if i != j and old_pos == new_positions[j]:
+                if new_positions[i] == (other["grid_x"], other["grid_y"]):
+                    status = "LOSE"
+
+    goal_count = 0
+    for p, (x, y), state in zip(sim.players, new_positions, new_states):
+        p["grid_x"], p["grid_y"] = x, y
+        p["waited_on_warp"] = bool(state & 1)
+        p["piece"] = dict(p["piece"], direction=DIRECTIONS[(state >> 1) & 3])
+        if sim.compiled.goal_cells[state >> 3]:
+            goal_count += 1
+    sim.states = new_states
+
+    if status == "LOSE":
+        sim.status = "LOSE"
+    elif goal_count == len(sim.players):
+        sim.status = "WIN"
+    return sim.status
+
+
+def make_players(rng, map_data, count):
+    """通常マスに重ならないように count 人を置く"""
+    cells = [
+        (x, y)
+        for y, row in enumerate(map_data)
+        for x, tile in enumerate(row)
+        if tile == "00200"
+    ]
+    return [
+        {"grid_x": x, "grid_y": y, "piece": {"direction": rng.choice(DIRECTIONS)}}
+        for x, y in rng.sample(cells, count)
+    ]
+
+
+def check_equivalence(seed, trials):
+    """ランダムな密集マップで、各ステップの状態と座標が参照実装と一致することを確かめる"""
+    rng = random.Random(seed)
+    tiles = ["00200"] * 12 + ["00000", "00100", "00300", "00400", "00500"]
+    tiles += ["00600", "00700", "00800", "00800", "00801", "00801"]
+    for _ in range(trials):
+        rows, cols = rng.randint(5, 30), rng.randint(5, 30)
+        map_data = [[rng.choice(tiles) for _ in range(cols)] for _ in range(rows)]
+        num_normal = sum(row.count("00200") for row in map_data)
+        players = make_players(rng, map_data, rng.randint(1, min(num_normal, 500)))
+
+        sim = Simulator(map_data, copy.deepcopy(players))
+        ref = Simulator(map_data, copy.deepcopy(players))
+        for _ in range(40):
+            if sim.step() != reference_step(ref):
+                raise SystemExit("step の結果が参照実装と一致しません")
+            if sim.players != ref.players:
+                raise SystemExit("step 後の座標が参照実装と一致しません")
+            if sim.status != "CONTINUE":
+                break
+
+
+def time_steps(step, map_data, players, steps):
+    sim = Simulator(map_data, copy.deepcopy(players))
+    start = time.perf_counter()
+    for _ in range(steps):
+        step(sim)
+    return (time.perf_counter() - start) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Simulator.step の衝突判定スケーリング"
+    )
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--trials", type=int, default=300)
+    parser.add_argument("--steps", type=int, default=50)
+    args = parser.parse_args()
+
+    check_equivalence(args.seed, args.trials)
+    print(f"equivalence: {args.trials} random maps OK")
+
+    for count in PLAYER_COUNTS:
+        # 1人1行で右へ進み続ける (衝突せず、毎ステップ全員が動く)
+        map_data = [["00200"] * (args.steps + 1) for _ in range(count)]
+        players = [
+            {"grid_x": 0, "grid_y": y, "piece": {"direction": "right"}}
+            for y in range(count)
+        ]
+        fast = time_steps(Simulator.step, map_data, players, args.steps)
+        naive = time_steps(reference_step, map_data, players, args.steps)
+        print(
+            f"players={count:4d} step={fast * 1e6:9.1f} us "
+            f"naive={naive * 1e6:10.1f} us speedup={naive / fast:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# d:/game/puzzle/bench/bench_solver_cache.py
+# SolverCache のベンチマーク
+# stages/ の全ステージを空のキャッシュで検証した時間と、2回目 (キャッシュ済み) の時間を比べる
+# RELEVANT FILES: src/game/solver_cache.py, src/game/loader.py
+
+import argparse
+import os
+import tempfile
+import time
+
+from src.game.loader import StageLoader
+from src.game.solver_cache import SolverCache
+
+
+def check_all(cache, loader):
+    """全ステージを検証し、(経過時間, レベルごとの判定) を返す"""
+    start = time.perf_counter()
+    verdicts = {}
+    for level in loader.get_available_levels():
+        path = os.path.join(loader.stages_dir, f"{level}.json")
+        verdicts[level] = cache.check_stage(path)["verdict"]
+    return time.perf_counter() - start, verdicts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SolverCache の cold / warm 計測")
+    parser.add_argument("--stages-dir", default="stages")
+    args = parser.parse_args()
+
+    loader = StageLoader(args.stages_dir)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cold_time, cold = check_all(SolverCache(cache_dir), loader)
+        cache = SolverCache(cache_dir)
+        warm_time, warm = check_all(cache, loader)
+
+    if cold != warm:
+        raise SystemExit("キャッシュの結果が探索結果と一致しません")
+
+    for level, verdict in cold.items():
+        print(f"level {level:2d}: {verdict}")
+    print(f"cold={cold_time * 1000:8.1f} ms")
+    print(
+        f"warm={warm_time * 1000:8.1f} ms hits={cache.hits} misses={cache.misses} "
+        f"speedup={cold_time / warm_time:6.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# d:/game/puzzle/bench/bench_stage_prefetch.py
+# ステージ切り替えの計測
+# 同期読み込み (画像キャッシュなし / あり) と、先読み済みのステージを受け取るだけの場合を比べる
+# RELEVANT FILES: src/game/prefetch.py, src/game/images.py, src/states/play.py
+
+import argparse
+import os
+import time
+
+# 画面のない環境でも Surface.convert_alpha を使えるようにする
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from src.const import SCREEN_WIDTH, SCREEN_HEIGHT
+from src.game import images
+from src.game.loader import StageLoader
+from src.game.prefetch import StagePrefetcher, prepare_stage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ステージ切り替えの計測")
+    parser.add_argument("--stages-dir", default="stages")
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    loader = StageLoader(args.stages_dir)
+    levels = loader.get_available_levels()
+
+    print(f"{'level':>5s} {'cold':>9s} {'cached':>9s} {'prefetched':>11s}")
+    for level in levels:
+        # 画像キャッシュなし (変更前の同期読み込みに相当)
+        images._sources.clear()
+        images._scaled.clear()
+        start = time.perf_counter()
+        prepare_stage(loader, level)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        prepare_stage(loader, level)
+        cached = time.perf_counter() - start
+
+        prefetcher = StagePrefetcher(loader)
+        prefetcher.start(level)
+        prefetcher._thread.join()
+        start = time.perf_counter()
+        prepared = prefetcher.take(level)
+        swap = time.perf_counter() - start
+        if prepared is None:
+            raise SystemExit(f"level {level}: 先読みに失敗しました")
+
+        print(
+            f"{level:5d} {cold * 1e3:7.2f}ms {cached * 1e3:7.2f}ms "
+            f"{swap * 1e6:9.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
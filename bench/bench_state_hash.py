@@ -0,0 +1,112 @@
+# d:/game/puzzle/bench/bench_state_hash.py
+# 全体状態のハッシュのマイクロベンチマーク
+# 以前の Solver._hash_state (ソートしたタプル + 履歴 set) と Simulator.state_hash (Zobrist + Brent 法) でループ検知を比べる
+# RELEVANT FILES: src/game/simulator.py, src/game/compiled_map.py
+
+import argparse
+import copy
+import random
+import time
+
+from src.game.simulator import Simulator
+
+PLAYER_COUNTS = (1, 4, 16, 64, 256)
+
+
+def sorted_state_key(players):
+    """以前の Solver._hash_state と同じ、ソートしたタプルによるキー"""
+    p_list = []
+    for p in players:
+        p_list.append(
+            (
+                p["grid_x"],
+                p["grid_y"],
+                p["piece"]["direction"],
+                p.get("waited_on_warp", False),
+            )
+        )
+    p_list.sort()
+    return tuple(p_list)
+
+
+def detect_sorted(sim, max_steps):
+    """全ステップの履歴を set に持つ以前の方式。ループを検知したステップ数を返す"""
+    history = set()
+    while sim.steps < max_steps:
+        key = sorted_state_key(sim.players)
+        if key in history:
+            return sim.steps
+        history.add(key)
+        sim.step()
+    return -1
+
+
+def detect_zobrist(sim, max_steps):
+    """Zobrist ハッシュと Brent 法。ハッシュが一致した時だけ完全なキーで確かめる"""
+    saved_hash = sim.state_hash
+    saved_key = sim.state_key()
+    power = lam = 1
+    collisions = 0
+    while sim.steps < max_steps:
+        sim.step()
+        if sim.state_hash == saved_hash:
+            if sim.state_key() == saved_key:
+                return sim.steps, collisions
+            collisions += 1
+        if lam == power:
+            saved_hash = sim.state_hash
+            saved_key = sim.state_key()
+            power <<= 1
+            lam = 0
+        lam += 1
+    return -1, collisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ソート方式と Zobrist の比較")
+    parser.add_argument("--width", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for count in PLAYER_COUNTS:
+        # 各駒が別々の行の両端の矢印で折り返して往復し続ける (衝突しない)
+        width = args.width
+        map_data = [["00600"] + ["00200"] * width + ["00700"] for _ in range(count)]
+        players = [
+            {
+                "grid_x": rng.randint(1, width),
+                "grid_y": y,
+                "piece": {"direction": rng.choice(("left", "right"))},
+            }
+            for y in range(count)
+        ]
+        max_steps = width * 8
+
+        # ステップ実行だけの時間 (Zobrist の更新込み)
+        sim = Simulator(map_data, copy.deepcopy(players))
+        start = time.perf_counter()
+        while sim.steps < max_steps:
+            sim.step()
+        base = (time.perf_counter() - start) / max_steps
+
+        sim = Simulator(map_data, copy.deepcopy(players))
+        start = time.perf_counter()
+        sorted_at = detect_sorted(sim, max_steps)
+        sorted_time = (time.perf_counter() - start) / max(sim.steps, 1) - base
+
+        sim = Simulator(map_data, copy.deepcopy(players))
+        start = time.perf_counter()
+        zobrist_at, collisions = detect_zobrist(sim, max_steps)
+        zobrist_time = (time.perf_counter() - start) / max(sim.steps, 1) - base
+
+        print(
+            f"players={count:4d} step={base * 1e6:8.2f} us | "
+            f"sorted: loop@{sorted_at:4d} +{sorted_time * 1e6:8.2f} us/step | "
+            f"zobrist: loop@{zobrist_at:4d} +{zobrist_time * 1e6:8.2f} us/step "
+            f"collisions={collisions}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# d:/game/puzzle/bench/bench_tile_grid.py
+# タイルコードのグリッドの計測
+# 公式ステージと大きなマップで、文字列の2次元リストと TileGrid のメモリ量・セルごとの判定時間を比べる
+# RELEVANT FILES: src/game/tile_grid.py, src/game/map.py, src/game/loader.py
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from src.const import TILE_NULL, TILE_PIT, TILE_NORMAL, TILE_GOAL
+from src.game.loader import StageLoader
+from src.game.tile_grid import TileGrid, CODE_NULL, CODE_PIT, CODE_NORMAL, CODE_GOAL
+
+
+def list_bytes(map_data):
+    """文字列の2次元リストのメモリ量 (リスト本体と、別々のオブジェクトになっている文字列)"""
+    total = sys.getsizeof(map_data)
+    seen = set()
+    for row in map_data:
+        total += sys.getsizeof(row)
+        for tile_id in row:
+            if id(tile_id) not in seen:
+                seen.add(id(tile_id))
+                total += sys.getsizeof(tile_id)
+    return total
+
+
+def grid_bytes(grid):
+    return (
+        sys.getsizeof(grid) + sys.getsizeof(grid.__dict__) + sys.getsizeof(grid.codes)
+    )
+
+
+def scan_strings(map_data):
+    """以前の TileMap.fit_to_area / draw と同じ文字列の比較 (比較用)"""
+    count = 0
+    for row in map_data:
+        for tile_id in row:
+            if tile_id != TILE_PIT and tile_id != TILE_NULL:
+                count += 1
+            if tile_id == TILE_GOAL or tile_id.startswith("008"):
+                count += 1
+            if tile_id == TILE_NORMAL:
+                count += 1
+    return count
+
+
+def scan_codes(grid):
+    """同じ判定をタイルコードで行う"""
+    count = 0
+    for code in grid.codes:
+        if code != CODE_PIT and code != CODE_NULL:
+            count += 1
+        if code == CODE_GOAL or code >= 8:  # 8 以降はワープ (と未知のID)
+            count += 1
+        if code == CODE_NORMAL:
+            count += 1
+    return count
+
+
+def time_it(func, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(arg)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def random_map(rng, size):
+    tiles = ["00000", "00100", "00200", "00200", "00200", "00300", "00400", "00801"]
+    return [[rng.choice(tiles) for _ in range(size)] for _ in range(size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文字列のマップと TileGrid の比較")
+    parser.add_argument("--stages-dir", default="stages")
+    parser.add_argument("--size", type=int, default=200, help="大きなマップの一辺")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    loader = StageLoader(args.stages_dir)
+    cases = []
+    for level in loader.get_available_levels():
+        # JSON から読んだ直後の形 (文字列はセルごとに別オブジェクト)
+        with open(f"{args.stages_dir}/{level}.json", "r", encoding="utf-8") as f:
+            cases.append((f"level {level}", json.load(f)["map_data"]))
+    big = json.loads(json.dumps(random_map(random.Random(0), args.size)))
+    cases.append((f"random {args.size}x{args.size}", big))
+
+    for name, map_data in cases:
+        start = time.perf_counter()
+        grid = TileGrid(map_data)
+        convert = time.perf_counter() - start
+
+        repeat = max(1, args.repeat * 100 // (grid.rows * grid.cols))
+        t_str, n_str = time_it(scan_strings, map_data, repeat)
+        t_code, n_code = time_it(scan_codes, grid, repeat)
+        if n_str != n_code:
+            raise SystemExit(f"{name}: コードの判定結果が文字列の比較と一致しません")
+        print(
+            f"{name:18s} cells={grid.rows * grid.cols:6d} "
+            f"memory={list_bytes(map_data):8d} -> {grid_bytes(grid):7d} B "
+            f"scan={t_str * 1e6:9.1f} -> {t_code * 1e6:9.1f} us "
+            f"(convert {convert * 1e6:.1f} us)"
+        )
+
+
+if __name__ == "__main__":
+    main()
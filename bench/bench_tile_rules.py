@@ -0,0 +1,94 @@
+# d:/game/puzzle/bench/bench_tile_rules.py
+# タイル規則の登録表によるディスパッチの計測
+# 公式ステージで、登録表 (TileRule.step) と以前の if/elif の分岐による遷移の計算時間・結果を比べる
+# RELEVANT FILES: src/game/tiles.py, src/game/compiled_map.py, src/game/loader.py
+
+import argparse
+import time
+
+from src.const import TILE_GOAL, TILE_UP, TILE_DOWN, TILE_LEFT, TILE_RIGHT
+from src.game.compiled_map import CompiledMap, DIR_INDEX
+from src.game.loader import StageLoader
+
+ARROW_DIRECTIONS = {
+    TILE_UP: DIR_INDEX["up"],
+    TILE_DOWN: DIR_INDEX["down"],
+    TILE_LEFT: DIR_INDEX["left"],
+    TILE_RIGHT: DIR_INDEX["right"],
+}
+
+
+def reference_transition(compiled, state):
+    """登録表を使う前の CompiledMap._compile_state と同じ if/elif の分岐 (比較用)"""
+    cell = state >> 3
+    x, y = compiled.position(cell)
+    tile_id = compiled.map_data[y][x]
+    waited = state & 1
+
+    if tile_id.startswith("008") and not waited:
+        target = compiled.params[cell]
+        if target >= 0:
+            return (target << 3) | (state & 6) | 1
+        return state & ~1
+    if tile_id in ARROW_DIRECTIONS and not waited:
+        return (cell << 3) | (ARROW_DIRECTIONS[tile_id] << 1) | 1
+    if tile_id == TILE_GOAL:
+        return state & ~1
+    next_cell = compiled.moves[state >> 1]
+    if next_cell < 0:
+        return next_cell
+    return (next_cell << 3) | (state & 6)
+
+
+def time_per_state(func, compiled, repeat):
+    """全状態の遷移を repeat 回求め、1状態あたりのナノ秒を返す"""
+    states = range(compiled.num_states)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for state in states:
+            func(compiled, state)
+    elapsed = time.perf_counter() - start
+    return elapsed / (repeat * compiled.num_states) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="タイル規則のディスパッチの比較")
+    parser.add_argument("--stages-dir", default="stages")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    loader = StageLoader(args.stages_dir)
+    totals = [0.0, 0.0, 0.0]
+    for level in loader.get_available_levels():
+        map_data = loader.load_stage(level)["map_data"]
+        compiled = CompiledMap(map_data)
+
+        reference = [
+            reference_transition(compiled, s) for s in range(compiled.num_states)
+        ]
+        if reference != compiled.transitions:
+            raise SystemExit(
+                f"level {level}: 登録表の遷移が if/elif の分岐と一致しません"
+            )
+
+        chain = time_per_state(reference_transition, compiled, args.repeat)
+        table = time_per_state(CompiledMap._compile_state, compiled, args.repeat)
+        lookup = time_per_state(CompiledMap.step, compiled, args.repeat)
+        for i, value in enumerate((chain, table, lookup)):
+            totals[i] += value
+        print(
+            f"level {level:2d} states={compiled.num_states:4d} "
+            f"if-chain={chain:6.1f} registry={table:6.1f} "
+            f"transitions={lookup:6.1f} ns/state"
+        )
+
+    count = len(loader.get_available_levels())
+    print(
+        f"mean             if-chain={totals[0] / count:6.1f} "
+        f"registry={totals[1] / count:6.1f} transitions={totals[2] / count:6.1f} "
+        "ns/state"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+# d:/game/puzzle/src/cli.py
+# ヘッドレスのコマンドラインツール
+# pygame / tkinter を読み込まずにステージの求解・シミュレーション・検証を行い、結果を JSON Lines で出力する
+# RELEVANT FILES: src/game/solver.py, src/game/simulator.py, src/game/loader.py
+#
+# 使い方:
+#   python -m src.cli solve stages/3.json --limit 10
+#   python -m src.cli simulate stages
+#   python -m src.cli verify stages --cache
+#   python -m src.cli record stages --out traces/demo.trace
+#   python -m src.cli bundle stages --check
+#   python -m src.cli compile stages
+#
+# 起動を速くするため、ゲームロジックのモジュールは各コマンドの中で読み込む
+
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def iter_stage_paths(paths):
+    """
+    ファイルはそのまま、ディレクトリはレベル番号順の <n>.json を返す
+    (バンドルにしかないレベルは JSON がないため含めない)
+    """
+    from src.game.loader import StageLoader
+
+    for path in paths:
+        if os.path.isdir(path):
+            loader = StageLoader(path)
+            for level in loader.get_available_levels():
+                stage_path = os.path.join(path, f"{level}.json")
+                if os.path.isfile(stage_path):
+                    yield stage_path
+        else:
+            yield path
+
+
+def load_stage(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def answer_players(stage):
+    """ステージJSONの正解配置を Simulator に渡す形式にする (正解がなければ None)"""
+    players = []
+    for p in stage["players"]:
+        if "answer" not in p:
+            return None
+        players.append(
+            {
+                "grid_x": p["answer"]["x"],
+                "grid_y": p["answer"]["y"],
+                "piece": {"direction": p["direction"]},
+            }
+        )
+    return players
+
+
+def simulate_answer(stage, max_steps=None):
+    """
+    正解配置をシミュレーションする
+    Returns:
+        dict: {"status", "steps"} (正解がなければ status は None)
+    """
+    from src.game.simulator import Simulator
+
+    players = answer_players(stage)
+    if players is None:
+        return {"status": None, "steps": 0}
+
+    sim = Simulator(stage["map_data"], players)
+    # 勝てる配置は1人分の状態数以内に決着する (PackedEngine と同じ上限)
+    if max_steps is None:
+        max_steps = sim.compiled.num_states
+    return {"status": sim.run(max_steps), "steps": sim.steps}
+
+
+def warp_problems(warp_index):
+    """ペアになっていないワープ {ワープID: 枚数} (JSON にそのまま書ける形)"""
+    from src.game.compiled_map import find_warp_problems
+
+    return dict(find_warp_problems(warp_index))
+
+
+def cmd_solve(stage, args):
+    from src.game.solver import Solver
+
+    templates = [{"direction": p["direction"]} for p in stage["players"]]
+    solutions = Solver(stage["map_data"], templates).solve(
+        limit=args.limit, workers=args.workers
+    )
+    return {
+        "count": len(solutions),
+        "solutions": [[[p["grid_x"], p["grid_y"]] for p in s] for s in solutions],
+    }
+
+
+def cmd_simulate(stage, args):
+    return simulate_answer(stage, args.max_steps)
+
+
+def cmd_verify(stage, args, path=None):
+    """
+    ステージに書かれた正解配置でクリアできるか (と解の一意性) を調べる
+    --cache の場合は path のファイル単位で引くため、編集されたステージの古いエントリは消える
+    ペアになっていないワープがあれば、正解配置でクリアできても失敗にする
+    """
+    from src.game.compiled_map import build_warp_index
+    from src.game.solver import Solver
+    from src.game.solver_cache import (
+        SolverCache,
+        VERDICT_MULTIPLE,
+        VERDICT_NO_SOLUTION,
+        VERDICT_UNIQUE,
+    )
+
+    templates = [{"direction": p["direction"]} for p in stage["players"]]
+    if args.cache:
+        cache = SolverCache()
+        if path is not None:
+            verdict = cache.check_stage(path)["verdict"]
+        else:
+            verdict = cache.check(stage["map_data"], templates)["verdict"]
+    else:
+        found = len(Solver(stage["map_data"], templates).solve(limit=2))
+        verdict = (VERDICT_NO_SOLUTION, VERDICT_UNIQUE, VERDICT_MULTIPLE)[found]
+
+    answer = simulate_answer(stage)
+    problems = warp_problems(build_warp_index(stage["map_data"]))
+    ok = answer["status"] == "WIN" and not problems
+    if args.require_unique:
+        ok = ok and verdict == VERDICT_UNIQUE
+    return {
+        "verdict": verdict,
+        "answer": answer["status"],
+        "warp_problems": problems,
+        "ok": ok,
+    }
+
+
+def cmd_record(stage, args):
+    """
+    正解配置の実行をトレースとしてファイルに追記する
+    (--append がなければ main が最初のステージの前に出力ファイルを空にする)
+    """
+    from src.game.trace import append_traces, record_trace
+
+    players = answer_players(stage)
+    if players is None:
+        return {"outcome": None, "steps": 0, "bytes": 0}
+
+    trace = record_trace(stage["map_data"], players)
+    append_traces(args.out, [trace])
+    return {"outcome": trace.outcome, "steps": trace.num_steps, "bytes": trace.nbytes}
+
+
+def cmd_bundle(args):
+    """
+    ディレクトリの <n>.json をまとめてバンドルを作る (ステージ単位ではなくディレクトリ単位)
+    --check の場合は書き出したバンドルを開き直し、全ステージが JSON と一致するかを確かめる
+    """
+    from src.game.bundle import BUNDLE_FILENAME, StageBundle, write_bundle
+    from src.game.loader import validate_stage
+
+    failed = False
+    for stages_dir in args.paths:
+        record = {"command": "bundle", "stages_dir": stages_dir}
+        start = time.perf_counter()
+        try:
+            stages = {}
+            json_bytes = 0
+            for filename in os.listdir(stages_dir):
+                level, ext = os.path.splitext(filename)
+                if ext == ".json" and level.isdigit():
+                    path = os.path.join(stages_dir, filename)
+                    stages[int(level)] = load_stage(path)
+                    validate_stage(stages[int(level)], path)
+                    json_bytes += os.path.getsize(path)
+
+            out = args.out or os.path.join(stages_dir, BUNDLE_FILENAME)
+            write_bundle(out, stages)
+            record.update(
+                {
+                    "out": out,
+                    "levels": len(stages),
+                    "bytes": os.path.getsize(out),
+                    "json_bytes": json_bytes,
+                }
+            )
+
+            if args.check:
+                bundle = StageBundle(out)
+                mismatched = [
+                    level
+                    for level in sorted(set(stages) | set(bundle.levels()))
+                    if level not in bundle
+                    or level not in stages
+                    or bundle.decode(level) != stages[level]
+                ]
+                bundle.close()
+                record["mismatched"] = mismatched
+                record["ok"] = not mismatched
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+        if "error" in record or record.get("ok") is False:
+            failed = True
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+
+    return 1 if failed else 0
+
+
+def cmd_compile(args):
+    """
+    ディレクトリの全ステージのコンパイル済みデータを作る (ステージ単位ではなくディレクトリ単位)
+    内容が変わったステージだけを作り直す。--check の場合は書き込まず、古いものがあれば失敗にする
+    """
+    from src.game.loader import StageLoader
+    from src.game.stage_artifact import STATUS_STALE, artifact_path, compile_stages
+
+    failed = False
+    for stages_dir in args.paths:
+        start = time.perf_counter()
+        try:
+            results = compile_stages(
+                StageLoader(stages_dir),
+                force=args.force,
+                check_only=args.check,
+                limit=args.limit,
+            )
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            record = {"command": "compile", "stages_dir": stages_dir}
+            record["error"] = f"{type(e).__name__}: {e}"
+            record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            failed = True
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+            continue
+
+        for level, status, artifact in results:
+            record = {
+                "command": "compile",
+                "stage": artifact_path(stages_dir, level),
+                "level": level,
+                "status": status,
+            }
+            if artifact is not None:
+                record["verdict"] = artifact["verdict"]
+                record["warp_problems"] = warp_problems(artifact["warp_index"])
+            if status == STATUS_STALE:
+                failed = True
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+        print(
+            json.dumps(
+                {
+                    "command": "compile",
+                    "stages_dir": stages_dir,
+                    "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+                }
+            ),
+            flush=True,
+        )
+
+    return 1 if failed else 0
+
+
+COMMANDS = {
+    "solve": cmd_solve,
+    "simulate": cmd_simulate,
+    "verify": cmd_verify,
+    "record": cmd_record,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli",
+        description="ステージの求解・シミュレーション・検証 (JSON Lines で出力)",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    solve = sub.add_parser("solve", help="解 (開始位置の組み合わせ) を探す")
+    solve.add_argument("--limit", type=int, default=2, help="探す解の最大数")
+    solve.add_argument("--workers", type=int, default=1, help="探索プロセス数")
+
+    simulate = sub.add_parser("simulate", help="正解配置をシミュレーションする")
+    simulate.add_argument(
+        "--max-steps", type=int, default=None, help="最大ステップ数 (省略時は自動)"
+    )
+
+    verify = sub.add_parser("verify", help="解の一意性と正解配置を検証する")
+    verify.add_argument(
+        "--cache", action="store_true", help="ソルバー結果のキャッシュを使う"
+    )
+    verify.add_argument(
+        "--require-unique", action="store_true", help="解が一意でなければ失敗にする"
+    )
+
+    record = sub.add_parser("record", help="正解配置の実行をトレースに記録する")
+    record.add_argument("--out", required=True, help="トレースファイルのパス")
+    record.add_argument(
+        "--append",
+        action="store_true",
+        help="既存のファイルに追記する (省略時は書き直す)",
+    )
+
+    bundle = sub.add_parser("bundle", help="ステージディレクトリをバンドルにまとめる")
+    bundle.add_argument(
+        "--out", default=None, help="出力先 (省略時は <ディレクトリ>/stages.bundle)"
+    )
+    bundle.add_argument(
+        "--check", action="store_true", help="書き出したバンドルを JSON と照合する"
+    )
+
+    compile_ = sub.add_parser(
+        "compile", help="ステージの解析結果を stages/compiled/ に保存する (差分のみ)"
+    )
+    compile_.add_argument("--limit", type=int, default=2, help="探す解の最大数")
+    compile_.add_argument("--force", action="store_true", help="最新のものも作り直す")
+    compile_.add_argument(
+        "--check", action="store_true", help="書き込まず、古いものがあれば失敗にする"
+    )
+
+    for p in (solve, simulate, verify, record):
+        p.add_argument(
+            "paths", nargs="*", default=["stages"], help="ステージJSONかディレクトリ"
+        )
+    for p in (bundle, compile_):
+        p.add_argument(
+            "paths", nargs="*", default=["stages"], help="ステージのディレクトリ"
+        )
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "bundle":
+        return cmd_bundle(args)
+    if args.command == "compile":
+        return cmd_compile(args)
+    command = COMMANDS[args.command]
+    if args.command == "record":
+        # 同じコマンドを再実行してもトレースが重複しないよう、既定では書き直す
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        if not args.append:
+            open(args.out, "wb").close()
+
+    failed = False
+    for path in iter_stage_paths(args.paths):
+        record = {"command": args.command, "stage": path}
+        start = time.perf_counter()
+        try:
+            stage = load_stage(path)
+            if command is cmd_verify:
+                record.update(cmd_verify(stage, args, path))
+            else:
+                record.update(command(stage, args))
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+        if "error" in record or record.get("ok") is False:
+            failed = True
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+
+    # ディレクトリを検証したら、削除されたステージ・古いバージョンのエントリを片付ける
+    if args.command == "verify" and args.cache:
+        if any(os.path.isdir(path) for path in args.paths):
+            from src.game.solver_cache import SolverCache
+
+            removed = SolverCache().prune()
+            print(json.dumps({"command": "prune", "removed": removed}), flush=True)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
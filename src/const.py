@@ -47,7 +47,8 @@ TILE_WARP = "00800"  # ワープ
 # シミュレーション設定
 SIM_STEP_DELAY = 500  # ms
 SIM_ANIM_DURATION = 500  # ms - アニメーション時間 (< SIM_STEP_DELAY)
-SIMULATION_TIMEOUT = 30000  # ms - シミュレーション制限時間
+SIM_SPEEDS = (1, 2, 4)  # 再生速度の倍率 (右キーで切り替え)
+DEMO_TRACE_PATH = "traces/demo.trace"  # アトラクトモードで再生するトレース
 
 # ゲーム状態
 GAME_STATE_PLACING = "placing"
@@ -0,0 +1,103 @@
+# d:/game/puzzle/src/game/batch_engine.py
+# NumPy による一括シミュレーションエンジン
+# 多数の配置をパック状態の配列で持ち、全配置を同時に1ステップずつ進めて勝敗を判定する
+# RELEVANT FILES: src/game/engine.py, src/game/compiled_map.py, src/game/solver.py
+
+try:
+    import numpy as np
+except ImportError:  # NumPy はオプション (一括判定を使う時だけ必要)
+    np = None
+
+
+class BatchEngine:
+    def __init__(self, compiled, max_steps=None):
+        """
+        Args:
+            compiled: CompiledMap (ステージごとに1回だけ作成したもの)
+            max_steps: シミュレーションの最大ステップ数
+                       (省略時は PackedEngine と同じく1人分の状態数)
+        """
+        if np is None:
+            raise ImportError(
+                "BatchEngine requires NumPy. Install it with 'pip install numpy'."
+            )
+
+        self.compiled = compiled
+        self.max_steps = compiled.num_states if max_steps is None else max_steps
+        # 遷移表とゴールフラグを配列にして、全配置のタイル判定を1回の添字参照で行う
+        self.transitions = np.asarray(compiled.transitions, dtype=np.int32)
+        self.goal_cells = np.frombuffer(bytes(compiled.goal_cells), dtype=np.uint8)
+
+    def run(self, placements):
+        """
+        配置をまとめてシミュレーションし、配置ごとにクリアできるかを返す。
+        判定の規則と順序は PackedEngine.run と同じ (落下 -> 衝突 -> 全員ゴール -> ループ)。
+        Args:
+            placements: パック状態の2次元配列 (配置数 N × 駒数 P)
+        Returns:
+            numpy.ndarray: 長さ N の bool 配列 (True if win)
+        """
+        states = np.array(placements, dtype=np.int32, ndmin=2)
+        num_placements, num_players = states.shape
+        wins = np.zeros(num_placements, dtype=bool)
+        if num_placements == 0:
+            return wins
+
+        # 決着がついていない配置の元のインデックス (決着したものは配列から外していく)
+        alive = np.arange(num_placements)
+        old_cells = states >> 3
+
+        # 無限ループ検知 (Brent 法)
+        # 全配置が同じステップ数で進むため、記録のタイミングは全配置で共通にできる
+        saved = states.copy()
+        power = 1
+        lam = 1
+
+        for _ in range(self.max_steps):
+            states = self.transitions[states]
+
+            # マップ外 / 奈落
+            lost = (states < 0).any(axis=1)
+            new_cells = np.where(states < 0, -1, states >> 3)
+
+            if num_players > 1:
+                # 衝突判定 (同じセルに2人以上)
+                sorted_cells = np.sort(new_cells, axis=1)
+                lost |= (sorted_cells[:, 1:] == sorted_cells[:, :-1]).any(axis=1)
+
+                # 正面衝突 (Swap) 判定
+                for i in range(num_players):
+                    moved = old_cells[:, i] != new_cells[:, i]
+                    for j in range(i + 1, num_players):
+                        lost |= (
+                            moved
+                            & (old_cells[:, i] == new_cells[:, j])
+                            & (new_cells[:, i] == old_cells[:, j])
+                        )
+
+            # 全員ゴール上なら勝利
+            won = ~lost & self.goal_cells[np.maximum(new_cells, 0)].all(axis=1)
+            wins[alive[won]] = True
+
+            # 記録した状態に戻ったら無限ループ
+            lost |= (states == saved).all(axis=1)
+
+            # 決着した配置を外す
+            keep = ~(lost | won)
+            if not keep.all():
+                alive = alive[keep]
+                if len(alive) == 0:
+                    break
+                states = states[keep]
+                new_cells = new_cells[keep]
+                saved = saved[keep]
+
+            if lam == power:
+                saved = states.copy()
+                power <<= 1
+                lam = 0
+            lam += 1
+
+            old_cells = new_cells
+
+        return wins
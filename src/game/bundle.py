@@ -0,0 +1,188 @@
+# d:/game/puzzle/src/game/bundle.py
+# ステージのバンドルファイル
+# stages/ の全ステージを1つのバイナリにまとめ、mmap で開いて必要なレベルだけを復号する
+# RELEVANT FILES: src/game/loader.py, src/cli.py
+#
+# 形式 (リトルエンディアン):
+#   ヘッダー: マジック "LTSB", バージョン (u16), ステージ数 (u16), タイルIDの種類数 (u16)
+#   タイルID表: 種類ごとに 長さ (u8) + ASCII 文字列。グリッドのバイト値はこの表の添字
+#   索引: ステージごとに レベル (u32), 先頭位置 (u32), バイト数 (u32)
+#   ステージ: 列数 (u16), 行数 (u16), 駒数 (u16), 行優先のタイルコード (列数 × 行数 バイト),
+#             駒ごとに 向き (u8), 正解の有無 (u8), 正解の x (i16), 正解の y (i16)
+
+import mmap
+import os
+import struct
+
+from src.game.compiled_map import DIRECTIONS, DIR_INDEX
+from src.game.fileutil import atomic_write
+
+BUNDLE_MAGIC = b"LTSB"
+BUNDLE_VERSION = 1
+BUNDLE_FILENAME = "stages.bundle"
+
+HEADER = struct.Struct("<4sHHH")
+INDEX_ENTRY = struct.Struct("<III")
+STAGE_HEADER = struct.Struct("<HHH")
+PLAYER = struct.Struct("<BBhh")
+
+# バンドルに保存できるキー (これ以外のキーを持つステージは encode_bundle が拒否する)
+STAGE_KEYS = {"map_data", "players"}
+PLAYER_KEYS = {"direction", "answer"}
+ANSWER_KEYS = {"x", "y"}
+
+
+def encode_bundle(stages):
+    """
+    ステージをバンドルのバイト列にする
+    Args:
+        stages: {レベル: ステージデータ} (StageLoader.load_stage と同じ形式)
+    Returns:
+        bytes
+    Raises:
+        ValueError: タイルIDが256種類を超える / 表せない値がある場合 /
+                    バンドルに保存できないキーがある場合 (復号した時に失われるため)
+    """
+    levels = sorted(stages)
+    tile_ids = sorted(
+        {t for level in levels for row in stages[level]["map_data"] for t in row}
+    )
+    if len(tile_ids) > 256:
+        raise ValueError(f"Too many tile IDs for a bundle: {len(tile_ids)}")
+    codes = {tile_id: i for i, tile_id in enumerate(tile_ids)}
+
+    table = bytearray()
+    for tile_id in tile_ids:
+        raw = tile_id.encode("ascii")
+        table.append(len(raw))
+        table += raw
+
+    bodies = []
+    for level in levels:
+        data = stages[level]
+        _check_keys(level, data, STAGE_KEYS)
+        map_data = data["map_data"]
+        players = data.get("players", [])
+        body = bytearray(
+            STAGE_HEADER.pack(len(map_data[0]), len(map_data), len(players))
+        )
+        for row in map_data:
+            body += bytes(codes[tile_id] for tile_id in row)
+        for p in players:
+            _check_keys(level, p, PLAYER_KEYS)
+            answer = p.get("answer")
+            if answer is not None:
+                _check_keys(level, answer, ANSWER_KEYS)
+            try:
+                body += PLAYER.pack(
+                    DIR_INDEX[p["direction"]],
+                    1 if answer is not None else 0,
+                    answer["x"] if answer is not None else 0,
+                    answer["y"] if answer is not None else 0,
+                )
+            except struct.error as e:
+                raise ValueError(f"Level {level}: cannot pack player {p!r}: {e}")
+        bodies.append(body)
+
+    offset = HEADER.size + len(table) + INDEX_ENTRY.size * len(levels)
+    out = bytearray(
+        HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(levels), len(tile_ids))
+    )
+    out += table
+    for level, body in zip(levels, bodies):
+        out += INDEX_ENTRY.pack(level, offset, len(body))
+        offset += len(body)
+    for body in bodies:
+        out += body
+    return bytes(out)
+
+
+def _check_keys(level, data, allowed):
+    extra = set(data) - allowed
+    if extra:
+        raise ValueError(f"Level {level}: keys not stored in a bundle: {sorted(extra)}")
+
+
+def write_bundle(path, stages):
+    """バンドルを書き出す (一時ファイルに書いてから置き換える)"""
+    atomic_write(path, encode_bundle(stages))
+
+
+class StageBundle:
+    def __init__(self, path):
+        """
+        バンドルを mmap で開き、ヘッダー・タイルID表・索引だけを読む
+        Raises:
+            OSError: 開けない場合
+            ValueError: 形式が正しくない場合
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self.mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._read_index()
+        except (struct.error, IndexError):
+            raise ValueError(f"Truncated stage bundle: {path}")
+
+    def _read_index(self):
+        """ヘッダー・タイルID表・索引を読む"""
+        path = self.path
+        magic, version, count, num_tile_ids = HEADER.unpack_from(self._data, 0)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"Not a stage bundle: {path}")
+        if version != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported stage bundle version {version}: {path}")
+
+        pos = HEADER.size
+        self.tile_ids = []
+        for _ in range(num_tile_ids):
+            length = self._data[pos]
+            self.tile_ids.append(self._data[pos + 1 : pos + 1 + length].decode("ascii"))
+            pos += 1 + length
+
+        # レベル -> (先頭位置, バイト数)
+        self._index = {}
+        for _ in range(count):
+            level, offset, size = INDEX_ENTRY.unpack_from(self._data, pos)
+            if offset + size > len(self._data):
+                raise ValueError(f"Truncated stage bundle: {path}")
+            self._index[level] = (offset, size)
+            pos += INDEX_ENTRY.size
+
+    def __contains__(self, level):
+        return level in self._index
+
+    def levels(self):
+        return sorted(self._index)
+
+    def decode(self, level):
+        """
+        1ステージ分だけを復号する
+        Returns:
+            dict: {"map_data": [...], "players": [{"direction", "answer"?}, ...]}
+        """
+        offset, _ = self._index[level]
+        cols, rows, num_players = STAGE_HEADER.unpack_from(self._data, offset)
+        pos = offset + STAGE_HEADER.size
+
+        tile_ids = self.tile_ids
+        map_data = []
+        for _ in range(rows):
+            map_data.append([tile_ids[code] for code in self._data[pos : pos + cols]])
+            pos += cols
+
+        players = []
+        for _ in range(num_players):
+            direction, has_answer, x, y = PLAYER.unpack_from(self._data, pos)
+            pos += PLAYER.size
+            player = {"direction": DIRECTIONS[direction]}
+            if has_answer:
+                player["answer"] = {"x": x, "y": y}
+            players.append(player)
+
+        return {"map_data": map_data, "players": players}
+
+    def close(self):
+        self._data.close()
@@ -0,0 +1,398 @@
+# d:/game/puzzle/src/game/compiled_map.py
+# コンパイル済みマップ
+# (セル, 向き, 待機フラグ) ごとの遷移先と失敗理由をステージごとに1回だけ前計算する
+# RELEVANT FILES: src/game/simulator.py, src/game/engine.py, src/game/solver.py, src/game/tiles.py
+
+import random
+
+from src.game.tile_grid import as_tile_grid, tile_id_of
+from src.game.tiles import (
+    TILE_RULES,
+    code_kind,
+    ENTER_BLOCKED,
+    ENTER_FATAL,
+    KIND_FLOOR,
+    KIND_WARP,
+)
+
+# 向きのインデックス (パック値の 2bit 分)
+DIRECTIONS = ("up", "down", "left", "right")
+DIR_INDEX = {d: i for i, d in enumerate(DIRECTIONS)}
+DIR_DELTAS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+# Zobrist ハッシュの乱数の種 (実行ごと・ステージごとに同じ値になるよう固定)
+ZOBRIST_SEED = 0x5A0B1157
+
+# 遷移表の失敗コード (負の値で表す)
+FATAL_PIT = -1  # 奈落に落ちた
+FATAL_OUT = -2  # マップ外に出た
+
+
+def pack_player(cell, dir_index, waited=False):
+    """プレイヤー状態を整数に詰める: cell << 3 | dir << 1 | waited"""
+    return (cell << 3) | (dir_index << 1) | (1 if waited else 0)
+
+
+def unpack_player(state):
+    """pack_player の逆変換 (cell, dir_index, waited)"""
+    return state >> 3, (state >> 1) & 3, state & 1
+
+
+def build_warp_index(map_data):
+    """
+    ワープIDごとのセル座標の一覧を作る
+    Args:
+        map_data: タイルIDの2次元リスト、または TileGrid
+    Returns:
+        dict: {ワープID: [(x, y), ...]} (行優先の順)
+    """
+    grid = as_tile_grid(map_data)
+    cols = grid.cols
+    warp_index = {}
+    for cell, code in enumerate(grid.codes):
+        if code_kind(code) == KIND_WARP:
+            warp_index.setdefault(tile_id_of(code), []).append(
+                (cell % cols, cell // cols)
+            )
+    return warp_index
+
+
+def find_warp_problems(warp_index):
+    """
+    ペアになっていないワープIDを調べる
+    Args:
+        warp_index: build_warp_index の戻り値
+    Returns:
+        list: [(ワープID, 枚数), ...] 1枚だけ (行き先なし) か3枚以上 (行き先が偏る) のもの
+    """
+    return [
+        (warp_id, len(cells))
+        for warp_id, cells in sorted(warp_index.items())
+        if len(cells) != 2
+    ]
+
+
+class CompiledMap:
+    def __init__(self, map_data, warp_index=None):
+        """
+        Args:
+            map_data: タイルIDの2次元リスト
+            warp_index: 作成済みのワープの一覧 (build_warp_index の戻り値と同じ形式)。
+                        コンパイル済みのステージから渡せば走査を省く
+        """
+        self.map_data = map_data
+        # タイルはコードに変換して調べる (文字列の比較はコードの種類ごとに1回だけ)
+        self.grid = as_tile_grid(map_data)
+        self.rows = self.grid.rows
+        self.cols = self.grid.cols
+        self.size = self.rows * self.cols
+        # 1人分の状態数 (セル × 向き4 × 待機フラグ2)
+        self.num_states = self.size * 8
+
+        # セルごとの種類と付加情報 (矢印の向き / ワープ先セル) を1次元に展開
+        # 種類と振る舞いは src/game/tiles.py の登録表から引く
+        self.kinds = [KIND_FLOOR] * self.size
+        self.params = [-1] * self.size
+
+        # ワープIDごとのセル一覧 (行優先の順)。ワープ先はここから1回で引く
+        if warp_index is None:
+            warp_index = build_warp_index(self.grid)
+        self.warp_index = warp_index
+
+        for cell, code in enumerate(self.grid.codes):
+            kind = code_kind(code)
+            self.kinds[cell] = kind
+            param = TILE_RULES[kind].param
+            if param is not None:
+                x, y = cell % self.cols, cell // self.cols
+                self.params[cell] = param(self, tile_id_of(code), x, y)
+
+        # ゴールセルのフラグ
+        self.goal_cells = bytearray(
+            1 if TILE_RULES[kind].goal else 0 for kind in self.kinds
+        )
+
+        # 通常移動の行き先を (セル, 向き) ごとに前計算 (失敗時は FATAL_*)
+        self.moves = [FATAL_OUT] * (self.size * 4)
+        for cell in range(self.size):
+            x, y = cell % self.cols, cell // self.cols
+            for d, (dx, dy) in enumerate(DIR_DELTAS):
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < self.cols and 0 <= ny < self.rows):
+                    continue
+                next_cell = ny * self.cols + nx
+                enter = TILE_RULES[self.kinds[next_cell]].enter[d]
+                if enter == ENTER_BLOCKED:
+                    self.moves[cell * 4 + d] = cell  # 壁ドン停止
+                elif enter == ENTER_FATAL:
+                    self.moves[cell * 4 + d] = FATAL_PIT
+                else:
+                    self.moves[cell * 4 + d] = next_cell
+
+        # 遷移表: パック状態 -> 1ステップ後のパック状態 (失敗時は FATAL_*)
+        self.transitions = [self._compile_state(s) for s in range(self.num_states)]
+
+        # 解析結果のキャッシュ (必要になった時に計算する)
+        self._goal_distances = None
+        self._solo_outcomes = None
+        self._straight_runs = None
+        self._zobrist_keys = None
+        # _spans_overlap の作業用 (掃引したセルの印と向き)
+        self._stamp = 0
+        self._sweep_stamp = None
+        self._sweep_dir = None
+
+    def _warp_target(self, warp_id, current_x, current_y):
+        """
+        指定されたワープIDのペアとなるセル番号を返す (なければ -1)。
+        行優先で最初に見つかる自分以外の同じIDのセル (3つ以上ある場合も同じ規則)。
+        """
+        for x, y in self.warp_index[warp_id]:
+            if x != current_x or y != current_y:
+                return y * self.cols + x
+        return -1
+
+    def _compile_state(self, state):
+        """1人分の状態の遷移先を、乗っているタイルの規則 (TileRule.step) で求める"""
+        cell = state >> 3
+        return TILE_RULES[self.kinds[cell]].step(self, state, self.params[cell])
+
+    def cell_of(self, x, y):
+        return y * self.cols + x
+
+    def position(self, cell):
+        """セル番号 -> (x, y)"""
+        return cell % self.cols, cell // self.cols
+
+    def pack(self, x, y, direction, waited=False):
+        return pack_player(self.cell_of(x, y), DIR_INDEX[direction], waited)
+
+    def step(self, state):
+        """1人分の状態を1ステップ進める (表を1回引くだけ)"""
+        return self.transitions[state]
+
+    def goal_distances(self):
+        """
+        1人で動かした場合に、各パック状態からゴールに着くまでのステップ数を返す。
+        遷移表を逆向きにたどる幅優先探索で全状態をまとめて求める。
+        Returns:
+            list: 状態ごとのステップ数 (ゴール上は 0、到達できない場合は -1)
+        """
+        if self._goal_distances is not None:
+            return self._goal_distances
+
+        # 逆向きの遷移 (遷移先 -> 遷移元のリスト)
+        num_states = self.num_states
+        predecessors = [[] for _ in range(num_states)]
+        for state, next_state in enumerate(self.transitions):
+            if next_state >= 0:
+                predecessors[next_state].append(state)
+
+        # ゴール上の状態から逆向きに広げる
+        distances = [-1] * num_states
+        queue = []
+        for state in range(num_states):
+            if self.goal_cells[state >> 3]:
+                distances[state] = 0
+                queue.append(state)
+
+        for state in queue:
+            d = distances[state] + 1
+            for prev in predecessors[state]:
+                if distances[prev] < 0:
+                    distances[prev] = d
+                    queue.append(prev)
+
+        self._goal_distances = distances
+        return distances
+
+    def solo_outcomes(self):
+        """
+        1人で動かした場合の、各パック状態からの結末とステップ数を返す。
+        遷移表を先へたどった結果を記録しながら全状態をまとめて求める (各状態を1回ずつ調べる)。
+        結末とステップ数の定義は Trajectory の outcome / end_step と同じ。
+        Returns:
+            tuple: (結末のリスト OUTCOME_*, ステップ数のリスト)
+        """
+        if self._solo_outcomes is not None:
+            return self._solo_outcomes
+
+        from src.game.trajectory import (
+            OUTCOME_GOAL,
+            OUTCOME_PIT,
+            OUTCOME_OUT,
+            OUTCOME_LOOP,
+        )
+
+        num_states = self.num_states
+        transitions = self.transitions
+        goal_cells = self.goal_cells
+        outcomes = [None] * num_states
+        steps = [-1] * num_states
+
+        for start in range(num_states):
+            # まだ求めていない状態を先へたどる (chain の添字 = 開始からのステップ数)
+            chain = []
+            on_chain = {}
+            state = start
+            while True:
+                if steps[state] >= 0:
+                    outcome, length = outcomes[state], steps[state]
+                    break
+                if goal_cells[state >> 3]:
+                    outcome, length = OUTCOME_GOAL, 0
+                    outcomes[state], steps[state] = outcome, length
+                    break
+                if state in on_chain:
+                    # 繰り返しの部分は周期の長さで同じ状態に戻る
+                    cycle = chain[on_chain[state] :]
+                    del chain[on_chain[state] :]
+                    outcome, length = OUTCOME_LOOP, len(cycle)
+                    for s in cycle:
+                        outcomes[s], steps[s] = outcome, length
+                    break
+                next_state = transitions[state]
+                if next_state < 0:
+                    outcome = OUTCOME_PIT if next_state == FATAL_PIT else OUTCOME_OUT
+                    length = 1
+                    outcomes[state], steps[state] = outcome, length
+                    break
+                on_chain[state] = len(chain)
+                chain.append(state)
+                state = next_state
+
+            # 戻りながら結末とステップ数を埋める
+            for s in reversed(chain):
+                length += 1
+                outcomes[s], steps[s] = outcome, length
+
+        self._solo_outcomes = (outcomes, steps)
+        return self._solo_outcomes
+
+    def zobrist_keys(self):
+        """
+        パック状態ごとの 64bit 乱数を返す。
+        全員の値の XOR が並び順に依存しない全体状態のハッシュになり、
+        1人の状態が変わった時は古い値と新しい値を XOR するだけで更新できる。
+        """
+        if self._zobrist_keys is None:
+            rng = random.Random(ZOBRIST_SEED)
+            self._zobrist_keys = [rng.getrandbits(64) for _ in range(self.num_states)]
+        return self._zobrist_keys
+
+    def straight_runs(self):
+        """
+        各パック状態から、通常マスの上をまっすぐ進み続けるステップ数を返す。
+        この間はマスによる出来事 (矢印 / ワープ / ゴール / 奈落 / 壁 / 端) が起きないため、
+        他の駒とぶつからなければ何ステップ分でもまとめて進めてよい。
+        Returns:
+            list: 状態ごとのステップ数 (0 なら次のステップで何かが起きる / 止まっている)
+        """
+        if self._straight_runs is not None:
+            return self._straight_runs
+
+        runs = [-1] * self.num_states
+        transitions = self.transitions
+        kinds = self.kinds
+        for start in range(self.num_states):
+            # まだ求めていない状態を先へたどり、戻りながら長さを埋める
+            chain = []
+            state = start
+            while runs[state] < 0:
+                next_state = transitions[state]
+                if (
+                    kinds[state >> 3] != KIND_FLOOR
+                    or next_state < 0
+                    or next_state >> 3 == state >> 3
+                ):
+                    runs[state] = 0
+                    break
+                chain.append(state)
+                state = next_state
+            length = runs[state]
+            for state in reversed(chain):
+                length += 1
+                runs[state] = length
+
+        self._straight_runs = runs
+        return runs
+
+    def skippable_steps(self, states):
+        """
+        全員をまとめて進めても、1ステップずつ進めた場合と結果が変わらないステップ数を返す。
+        動いている駒が全員通常マスの直進中で、掃引する区間が他の駒と重ならない範囲に限る
+        (同じ向きに並んで進む駒同士は間隔が変わらないため重なっても構わない)。
+        Args:
+            states: 全員のパック状態のリスト
+        Returns:
+            int: まとめて進めるステップ数 (1 なら通常どおり1ステップ進める)
+        """
+        runs = self.straight_runs()
+        transitions = self.transitions
+        span = 0
+        for state in states:
+            if transitions[state] == state:
+                continue  # 止まっている駒 (ゴール上 / 壁の手前など)
+            run = runs[state]
+            if run < 2:
+                return 1
+            span = run if span == 0 else min(span, run)
+        if span < 2:
+            return 1
+
+        # 掃引区間が重なるなら、重ならなくなるまで区間を縮める
+        while span >= 2 and self._spans_overlap(states, span):
+            span //= 2
+        return max(span, 1)
+
+    def _spans_overlap(self, states, span):
+        """
+        span ステップの間に駒同士が接触する可能性があるか。
+        掃引するセルに印を付けて調べるため (Simulator._collides と同じ方式)、
+        駒同士を総当たりで比べず O(駒数 × span) で済む
+        """
+        transitions = self.transitions
+        if self._sweep_stamp is None:
+            self._sweep_stamp = [0] * self.size
+            self._sweep_dir = [0] * self.size
+        sweep_stamp = self._sweep_stamp
+        sweep_dir = self._sweep_dir
+
+        # 同じセルから始まる駒同士は必ず接触する
+        self._stamp += 1
+        stamp = self._stamp
+        for state in states:
+            cell = state >> 3
+            if sweep_stamp[cell] == stamp:
+                return True
+            sweep_stamp[cell] = stamp
+
+        # 掃引するセルに向きを記録する (止まっている駒は -1 で、その場の1セルだけ)。
+        # 同じ向きに並んで進む駒同士は間隔が変わらないため、同じセルを通っても接触しない
+        self._stamp += 1
+        stamp = self._stamp
+        for state in states:
+            cell = state >> 3
+            if transitions[state] == state:
+                direction, length, delta = -1, 1, 0
+            else:
+                direction = (state >> 1) & 3
+                dx, dy = DIR_DELTAS[direction]
+                length, delta = span + 1, dy * self.cols + dx
+            for _ in range(length):
+                if sweep_stamp[cell] == stamp:
+                    if direction < 0 or sweep_dir[cell] != direction:
+                        return True
+                else:
+                    sweep_stamp[cell] = stamp
+                    sweep_dir[cell] = direction
+                cell += delta
+        return False
+
+    def advance_straight(self, state, steps):
+        """通常マスの直進中の状態を steps ステップ進めた状態 (止まっている駒はそのまま)"""
+        if self.transitions[state] == state:
+            return state
+        dx, dy = DIR_DELTAS[(state >> 1) & 3]
+        cell = (state >> 3) + steps * (dy * self.cols + dx)
+        return (cell << 3) | (state & 6)
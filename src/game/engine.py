@@ -0,0 +1,102 @@
+# d:/game/puzzle/src/game/engine.py
+# ソルバー用の高速シミュレーションエンジン
+# プレイヤーを (セル番号, 向き, 待機フラグ) を詰めた整数で表し、辞書のコピーなしで勝敗を判定する
+# RELEVANT FILES: src/game/compiled_map.py, src/game/solver.py
+
+
+class PackedEngine:
+    def __init__(self, compiled, max_steps=None):
+        """
+        Args:
+            compiled: CompiledMap (ステージごとに1回だけ作成したもの)
+            max_steps: シミュレーションの最大ステップ数
+                       (省略時はステージの1人分の状態数から決める)
+        """
+        self.compiled = compiled
+        # 駒同士の干渉は敗北しか生まないため、勝てる配置では各駒が単独の軌跡どおりに動く。
+        # 単独でゴールに着く軌跡は同じ状態を2度通らないので、1人分の状態数以内に全員が着く。
+        self.max_steps = compiled.num_states if max_steps is None else max_steps
+
+    def run(self, players):
+        """
+        パック済みの配置でシミュレーションを実行し、クリアできるか判定
+        Args:
+            players: パック状態のリスト (待機フラグは通常 0)
+        Returns:
+            bool: True if win, False otherwise
+        """
+        goal_cells = self.compiled.goal_cells
+        transitions = self.compiled.transitions
+        num_players = len(players)
+        state = list(players)
+        old_cells = [s >> 3 for s in state]
+
+        # 無限ループ検知 (Brent 法)
+        # 履歴は持たず、2の累乗ステップごとに記録した1つの状態に戻ったかだけを調べる。
+        # 比較は Zobrist ハッシュで先にふるい、一致した時だけ全体を比べる。
+        keys = self.compiled.zobrist_keys()
+        state_hash = 0
+        for s in state:
+            state_hash ^= keys[s]
+        saved_hash = state_hash
+        saved_state = state[:]
+        power = 1
+        lam = 1
+
+        skippable_steps = self.compiled.skippable_steps
+        advance_straight = self.compiled.advance_straight
+        steps = 0
+        while steps < self.max_steps:
+            # 全員が通常マスを直進中なら、駒同士が接触しない範囲をまとめて進める
+            span = min(skippable_steps(state), self.max_steps - steps)
+            steps += span
+
+            new_cells = []
+            all_goal = True
+            for i in range(num_players):
+                s = state[i]
+                next_s = transitions[s] if span == 1 else advance_straight(s, span)
+                if next_s < 0:
+                    return False  # マップ外 / 奈落
+                if next_s != s:
+                    state_hash ^= keys[s] ^ keys[next_s]
+                    state[i] = next_s
+                cell = next_s >> 3
+                if not goal_cells[cell]:
+                    all_goal = False
+                new_cells.append(cell)
+
+            # 衝突判定 (同じセルに2人以上)
+            # まとめて進めた場合は接触しないことを確認済み
+            if span == 1 and num_players > 1:
+                if len(set(new_cells)) != num_players:
+                    return False
+
+                # 正面衝突 (Swap) 判定
+                for i in range(num_players):
+                    if old_cells[i] == new_cells[i]:
+                        continue
+                    for j in range(i + 1, num_players):
+                        if (
+                            old_cells[i] == new_cells[j]
+                            and new_cells[i] == old_cells[j]
+                        ):
+                            return False
+
+            # 全員ゴール上なら勝利
+            if all_goal:
+                return True
+
+            # 記録した状態に戻ったら無限ループ
+            if state_hash == saved_hash and state == saved_state:
+                return False
+            if lam == power:
+                saved_hash = state_hash
+                saved_state = state[:]
+                power <<= 1
+                lam = 0
+            lam += 1
+
+            old_cells = new_cells
+
+        return False  # ステップ切れでも失敗とみなす
@@ -0,0 +1,33 @@
+# d:/game/puzzle/src/game/fileutil.py
+# ファイル書き込みの共通処理
+# キャッシュ・コンパイル済みデータ・バンドルを、読み込み側に書き込み途中の内容を見せずに保存する
+# RELEVANT FILES: src/game/solver_cache.py, src/game/stage_artifact.py, src/game/bundle.py
+
+import os
+
+
+def atomic_write(path, data):
+    """
+    一時ファイルに書いてから置き換える (書き込み途中のファイルを読ませない)
+    Args:
+        path: 書き込み先。親ディレクトリがなければ作る
+        data: str (UTF-8 で書く) または bytes
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    # 同じファイルを別プロセスが同時に書いても一時ファイルはぶつからない
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # 失敗したら一時ファイルを残さない
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,48 @@
+# d:/game/puzzle/src/game/images.py
+# タイル・駒画像のキャッシュ
+# 同じファイルは1回だけ読み込み、タイルサイズごとに拡大した画像も使い回す (ワーカースレッドからも呼べる)
+# RELEVANT FILES: src/game/map.py, src/game/inventory.py, src/game/prefetch.py
+
+import threading
+from collections import OrderedDict
+
+import pygame
+
+SOURCE_SIZE = 32  # 画像ファイルの一辺 (このサイズなら拡大しない)
+MAX_CACHED_SIZES = 4  # 拡大済みの画像を保持するタイルサイズの数
+
+# パス -> 読み込んだ原寸の画像
+_sources = {}
+# タイルサイズ -> {パス: 拡大済みの画像}。末尾ほど最近使ったサイズ
+_scaled = OrderedDict()
+_lock = threading.Lock()
+
+
+def load_tile_image(path, size):
+    """
+    タイルサイズ size に拡大した画像を返す
+    返す Surface は呼び出し元で共有されるため、書き換えずに blit だけに使う
+    Args:
+        path: 画像ファイルのパス
+        size: タイルの一辺 (px)
+    Raises:
+        pygame.error / FileNotFoundError: 読み込めない場合
+    """
+    with _lock:
+        by_path = _scaled.get(size)
+        if by_path is None:
+            by_path = _scaled[size] = {}
+            while len(_scaled) > MAX_CACHED_SIZES:
+                _scaled.popitem(last=False)
+        else:
+            _scaled.move_to_end(size)
+
+        img = by_path.get(path)
+        if img is None:
+            img = _sources.get(path)
+            if img is None:
+                img = _sources[path] = pygame.image.load(path).convert_alpha()
+            if size != SOURCE_SIZE:
+                img = pygame.transform.scale(img, (size, size))
+            by_path[path] = img
+        return img
@@ -1,11 +1,12 @@
 # d:/game/puzzle/src/game/inventory.py
 # インベントリ（手持ちの駒）の描画クラス
 # プレイヤー画像を表示する
-# RELEVANT FILES: src/const.py, src/states/play.py
+# RELEVANT FILES: src/const.py, src/states/play.py, src/game/images.py
 
 import pygame
 import os
 from src.const import TILE_SIZE, COLOR_DARK_GRAY
+from src.game.images import load_tile_image
 
 
 class Inventory:
@@ -29,10 +30,7 @@ class Inventory:
             filename = f"{d}player0_tile0.png"
             path = os.path.join(self.img_dir, filename)
             if os.path.exists(path):
-                img = pygame.image.load(path).convert_alpha()
-                if self.tile_size != 32:
-                    img = pygame.transform.scale(img, (self.tile_size, self.tile_size))
-                self.images[d] = img
+                self.images[d] = load_tile_image(path, self.tile_size)
             else:
                 print(f"Warning: Player image not found: {path}")
 
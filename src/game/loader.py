@@ -1,43 +1,226 @@
 # d:/game/puzzle/src/game/loader.py
 # ステージデータのローダー
-# JSONファイルを読み込み、辞書形式で返す
-# RELEVANT FILES: src/states/play.py
+# JSONファイル (またはステージのバンドル) を読み込み、辞書形式で返す (更新時刻が変わるまでメモリに保持する)
+# RELEVANT FILES: src/states/play.py, src/states/attract.py, src/game/bundle.py, src/game/stage_artifact.py
 
+import copy
 import json
 import os
+import threading
+from collections import OrderedDict
+
+from src.game.bundle import BUNDLE_FILENAME, StageBundle
+from src.game.compiled_map import DIRECTIONS
+from src.game.stage_artifact import artifact_path, read_artifact, stage_key
+
+
+def validate_stage(data, path="<stage>"):
+    """
+    ステージデータの形式を確かめる
+    Raises:
+        ValueError: map_data が長方形の文字列の2次元リストでない / 駒の向きが不正な場合
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"Stage must be a JSON object: {path}")
+
+    map_data = data.get("map_data")
+    if not isinstance(map_data, list) or not map_data:
+        raise ValueError(f"Stage has no map_data: {path}")
+    width = len(map_data[0]) if isinstance(map_data[0], list) else -1
+    for row in map_data:
+        if not isinstance(row, list) or len(row) != width:
+            raise ValueError(f"map_data must be a rectangular 2D list: {path}")
+        if not all(isinstance(tile_id, str) for tile_id in row):
+            raise ValueError(f"map_data must contain tile ID strings: {path}")
+
+    players = data.get("players", [])
+    if not isinstance(players, list):
+        raise ValueError(f"players must be a list: {path}")
+    for p in players:
+        if not isinstance(p, dict) or p.get("direction") not in DIRECTIONS:
+            raise ValueError(f"Invalid player direction in {path}: {p!r}")
 
 
 class StageLoader:
-    def __init__(self, stages_dir="stages"):
+    def __init__(self, stages_dir="stages", max_entries=32):
+        """
+        Args:
+            stages_dir: ステージJSON (<レベル>.json) を置くディレクトリ
+            max_entries: メモリに保持するステージ数 (古く使われたものから捨てる)
+        """
         self.stages_dir = stages_dir
+        self.max_entries = max_entries
+
+        # レベル -> ((更新時刻, サイズ), 検証済みのステージデータ, 内容のハッシュ)。
+        # 末尾ほど最近使ったもの
+        self._stages = OrderedDict()
+        # レベル -> ((更新時刻, サイズ), 読み込んだコンパイル済みデータ | None)
+        self._artifacts = {}
+        # (ディレクトリの更新時刻, バンドルの更新時刻, レベル一覧)
+        self._levels = None
+        # ステージディレクトリ内のバンドル (なければ JSON だけを読む)
+        self.bundle_path = os.path.join(stages_dir, BUNDLE_FILENAME)
+        self._bundle = None
+        # 壊れていたバンドルの更新時刻 (作り直されるまで開き直さない)
+        self._broken_bundle_mtime = None
+        # 先読みスレッド (src/game/prefetch.py) とメインスレッドから同時に呼ばれるため
+        self._lock = threading.Lock()
+
+        # 統計 (確認用)
+        self.hits = 0
+        self.misses = 0
+        self.index_hits = 0
+        self.index_misses = 0
 
     def load_stage(self, level: int) -> dict:
-        """指定されたレベルのステージJSONを読み込む"""
+        """
+        指定されたレベルのステージJSONを読み込む
+        バンドルにあるレベルはバンドルから復号する (JSON の方が新しく編集されていれば JSON を読む)。
+        ファイルが変わっていなければ保持しているものを返す (呼び出し側で書き換えてよいよう複製する)
+        """
+        with self._lock:
+            return copy.deepcopy(self._load_entry(level)[1])
+
+    def _load_entry(self, level):
+        """(スタンプ, 検証済みのステージデータ, 内容のハッシュ) を返す (複製しない)"""
         filename = f"{level}.json"
         path = os.path.join(self.stages_dir, filename)
 
-        if not os.path.exists(path):
+        try:
+            st = os.stat(path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stamp = None
+
+        bundle = self._get_bundle()
+        if bundle is not None and level in bundle:
+            if stamp is None or stamp[0] <= bundle.mtime_ns:
+                path = bundle.path
+                stamp = ("bundle", bundle.mtime_ns)
+        if stamp is None:
+            self._stages.pop(level, None)
             raise FileNotFoundError(f"Stage file not found: {path}")
 
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            return data
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Invalid JSON format in {path}: {e}")
+        cached = self._stages.get(level)
+        if cached is not None and cached[0] == stamp:
+            self._stages.move_to_end(level)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        if stamp[0] == "bundle":
+            data = bundle.decode(level)
+        else:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON format in {path}: {e}")
+        validate_stage(data, path)
+
+        entry = self._stages[level] = (stamp, data, stage_key(data))
+        self._stages.move_to_end(level)
+        while len(self._stages) > self.max_entries:
+            self._stages.popitem(last=False)
+        return entry
+
+    def load_artifact(self, level: int) -> dict | None:
+        """
+        指定されたレベルのコンパイル済みデータ (src/game/stage_artifact.py) を返す
+        ステージが編集されて古くなっている / まだ作られていない場合は None (実行時には解析しない。
+        python -m src.cli compile で作り直す)
+        Raises:
+            FileNotFoundError / ValueError: load_stage と同じ
+        """
+        with self._lock:
+            key = self._load_entry(level)[2]
+            path = artifact_path(self.stages_dir, level)
+            try:
+                st = os.stat(path)
+                stamp = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                self._artifacts.pop(level, None)
+                return None
+
+            cached = self._artifacts.get(level)
+            if cached is None or cached[0] != stamp:
+                cached = self._artifacts[level] = (stamp, read_artifact(path))
+            artifact = cached[1]
+            if artifact is None or artifact["key"] != key:
+                return None
+            return copy.deepcopy(artifact)
 
     def get_available_levels(self) -> list[int]:
-        """利用可能なステージレベルのリストを取得"""
-        levels = []
-        if not os.path.exists(self.stages_dir):
-            return levels
+        """利用可能なステージレベルのリストを取得 (JSON とバンドルの和集合)"""
+        with self._lock:
+            return self._available_levels()
+
+    def _available_levels(self):
+        try:
+            mtime = os.stat(self.stages_dir).st_mtime_ns
+        except FileNotFoundError:
+            self._levels = None
+            return []
 
+        bundle = self._get_bundle()
+        bundle_mtime = bundle.mtime_ns if bundle is not None else None
+        if self._levels is not None and self._levels[:2] == (mtime, bundle_mtime):
+            self.index_hits += 1
+            return list(self._levels[2])
+
+        self.index_misses += 1
+        levels = set(bundle.levels()) if bundle is not None else set()
         for filename in os.listdir(self.stages_dir):
             if filename.endswith(".json"):
                 # "1.json" -> 1
                 basename = os.path.splitext(filename)[0]
                 if basename.isdigit():
-                    levels.append(int(basename))
+                    levels.add(int(basename))
+
+        levels = sorted(levels)
+        self._levels = (mtime, bundle_mtime, levels)
+        return list(levels)
+
+    def _get_bundle(self):
+        """バンドルを開く (更新されていたら開き直す。ない / 壊れている場合は None)"""
+        try:
+            mtime = os.stat(self.bundle_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+
+        if self._bundle is not None and self._bundle.mtime_ns != mtime:
+            self._bundle.close()
+            self._bundle = None
+        if (
+            self._bundle is None
+            and mtime is not None
+            and mtime != self._broken_bundle_mtime
+        ):
+            try:
+                self._bundle = StageBundle(self.bundle_path)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring stage bundle {self.bundle_path}: {e}")
+                self._broken_bundle_mtime = mtime
+        return self._bundle
+
+    def stats(self):
+        """キャッシュの統計"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "index_hits": self.index_hits,
+            "index_misses": self.index_misses,
+            "cached": len(self._stages),
+        }
+
+
+# ディレクトリごとの共有インスタンス (画面を切り替えてもキャッシュを使い回す)
+_shared_loaders = {}
+
 
-        levels.sort()
-        return levels
+def get_shared_loader(stages_dir="stages"):
+    """同じディレクトリに対して常に同じ StageLoader を返す"""
+    loader = _shared_loaders.get(stages_dir)
+    if loader is None:
+        loader = _shared_loaders[stages_dir] = StageLoader(stages_dir)
+    return loader
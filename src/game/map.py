@@ -1,9 +1,8 @@
 # d:/game/puzzle/src/game/map.py
 # タイルマップの描画クラス
 # タイルIDに基づいて画像を読み込み、マップを描画する
-# RELEVANT FILES: src/const.py, src/states/play.py
+# RELEVANT FILES: src/const.py, src/states/play.py, src/game/images.py
 
-import pygame
 import os
 from src.const import (
     TILE_SIZE,
@@ -17,11 +16,23 @@ from src.const import (
     TILE_WARP,
     TILE_PIT,
 )
+from src.game.tile_grid import (
+    TileGrid,
+    CODE_NULL,
+    CODE_PIT,
+    CODE_NORMAL,
+    num_tile_codes,
+    tile_id_of,
+)
+from src.game.tiles import code_kind, KIND_GOAL, KIND_WARP
+from src.game.images import load_tile_image
 
 
 class TileMap:
     def __init__(self, map_data: list[list[str]], img_dir="img"):
         self.map_data = map_data
+        # 描画・判定はタイルコードのグリッドを読む (map_data は JSON 互換の元データとして残す)
+        self.grid = TileGrid(map_data)
         self.img_dir = img_dir
 
         # タイルサイズ (デフォルトは定数)
@@ -34,8 +45,8 @@ class TileMap:
         self._load_player_images()
 
         # マップのサイズ（タイル数）
-        self.rows = len(map_data)
-        self.cols = len(map_data[0]) if self.rows > 0 else 0
+        self.rows = self.grid.rows
+        self.cols = self.grid.cols
 
         # マップ全体のピクセルサイズ
         self.width = self.cols * self.tile_size
@@ -56,7 +67,7 @@ class TileMap:
     def _load_images(self):
         """タイル画像の読み込み"""
         # IDとファイル名の対応
-        # 32x32の画像を読み込み、TILE_SIZE (64x64) にスケールする
+        # 32x32の画像を読み込み、タイルサイズにスケールする (同じサイズの画像はキャッシュから返る)
         image_files = {
             TILE_NULL: "null_tile.png",
             TILE_PIT: "null_tile.png",
@@ -76,23 +87,24 @@ class TileMap:
         # 枠画像の読み込み
         frame_path = os.path.join(self.img_dir, "frame0.png")
         if os.path.exists(frame_path):
-            img = pygame.image.load(frame_path).convert_alpha()
-            if self.tile_size != 32:
-                img = pygame.transform.scale(img, (self.tile_size, self.tile_size))
-            self.frame_image = img
+            self.frame_image = load_tile_image(frame_path, self.tile_size)
 
         for tile_id, filename in image_files.items():
             path = os.path.join(self.img_dir, filename)
             if os.path.exists(path):
-                img = pygame.image.load(path).convert_alpha()
-                img = pygame.image.load(path).convert_alpha()
-                # スケーリング
-                if self.tile_size != 32:
-                    img = pygame.transform.scale(img, (self.tile_size, self.tile_size))
-                self.images[tile_id] = img
+                self.images[tile_id] = load_tile_image(path, self.tile_size)
             else:
                 print(f"Warning: Image not found for tile {tile_id}: {path}")
 
+        # タイルコードごとの描画情報 (描画ループでは文字列を扱わない)
+        self.code_images = []  # コード -> 画像 (なければ None)
+        self.code_floor_under = bytearray()  # 下に床を描くか (ゴール / ワープ)
+        self.code_framed = bytearray()  # 枠を描くか (奈落・壁以外)
+        for code in range(num_tile_codes()):
+            self.code_images.append(self.images.get(tile_id_of(code)))
+            self.code_floor_under.append(code_kind(code) in (KIND_GOAL, KIND_WARP))
+            self.code_framed.append(code != CODE_PIT and code != CODE_NULL)
+
     def _load_player_images(self):
         """プレイヤー画像の読み込み（マップ描画用）"""
         self.player_images = {}  # dict[str, list[Surface]]
@@ -103,12 +115,7 @@ class TileMap:
                 filename = f"{d}player0_tile{i}.png"
                 path = os.path.join(self.img_dir, filename)
                 if os.path.exists(path):
-                    img = pygame.image.load(path).convert_alpha()
-                    if self.tile_size != 32:
-                        img = pygame.transform.scale(
-                            img, (self.tile_size, self.tile_size)
-                        )
-                    frames.append(img)
+                    frames.append(load_tile_image(path, self.tile_size))
                 else:
                     # 最初のフレームが見つからない場合は警告、それ以外は無視（フレーム数不足許容）
                     if i == 0:
@@ -133,30 +140,17 @@ class TileMap:
         w, h = self.valid_area_size
         return off_x, off_y, w, h
 
-    def fit_to_area(self, max_width, max_height):
-        """指定された領域に収まるようにタイルサイズを調整"""
+    def fit_to_area(self, max_width, max_height, bounds=None):
+        """
+        指定された領域に収まるようにタイルサイズを調整
+        Args:
+            bounds: 有効範囲 (最小列, 最小行, 最大列, 最大行)。
+                    コンパイル済みのステージ (src/game/stage_artifact.py) から渡せば走査を省く
+        """
         # 1. 有効範囲の検出 (PIT/NULL以外)
-        min_c, max_c = self.cols, -1
-        min_r, max_r = self.rows, -1
-        has_valid_tiles = False
-
-        for r, row in enumerate(self.map_data):
-            for c, tile_id in enumerate(row):
-                if tile_id != TILE_PIT and tile_id != TILE_NULL:
-                    if r < min_r:
-                        min_r = r
-                    if r > max_r:
-                        max_r = r
-                    if c < min_c:
-                        min_c = c
-                    if c > max_c:
-                        max_c = c
-                    has_valid_tiles = True
-
-        if not has_valid_tiles:
-            # 有効タイルがない場合は全体を有効とする
-            min_r, max_r = 0, self.rows - 1
-            min_c, max_c = 0, self.cols - 1
+        if bounds is None:
+            bounds = self.grid.content_bounds()
+        min_c, min_r, max_c, max_r = bounds
 
         # 2. 有効範囲のサイズ
         content_cols = max_c - min_c + 1
@@ -199,13 +193,13 @@ class TileMap:
     def is_valid_tile(self, grid_x, grid_y):
         """指定されたグリッド座標が有効な配置場所か判定"""
         if 0 <= grid_y < self.rows and 0 <= grid_x < self.cols:
-            tile_id = self.map_data[grid_y][grid_x]
+            code = self.grid.code_at(grid_x, grid_y)
             # 既に駒があるかチェック（単純化のため1マス1駒）
             for p in self.placed_pieces:
                 if p["grid_x"] == grid_x and p["grid_y"] == grid_y:
                     return False
             # 通常タイルのみ配置可能
-            return tile_id == TILE_NORMAL
+            return code == CODE_NORMAL
         return False
 
     def place_piece(self, grid_x, grid_y, piece):
@@ -226,25 +220,26 @@ class TileMap:
         self.last_offset_y = offset_y
 
         # タイル描画
-        for r, row in enumerate(self.map_data):
-            for c, tile_id in enumerate(row):
-                x = offset_x + c * self.tile_size
-                y = offset_y + r * self.tile_size
-
-                # ゴールやワープの下に床を描画
-                if tile_id == TILE_GOAL or tile_id.startswith("008"):
-                    normal_img = self.images.get(TILE_NORMAL)
-                    if normal_img:
-                        surface.blit(normal_img, (x, y))
-
-                # タイル描画
-                img = self.images.get(tile_id)
-                if img:
-                    surface.blit(img, (x, y))
-
-                # 枠描画 (奈落以外)
-                if tile_id != TILE_PIT and tile_id != TILE_NULL and self.frame_image:
-                    surface.blit(self.frame_image, (x, y))
+        code_images = self.code_images
+        normal_img = code_images[CODE_NORMAL]
+        cols = self.cols
+        for cell, code in enumerate(self.grid.codes):
+            r, c = divmod(cell, cols)
+            x = offset_x + c * self.tile_size
+            y = offset_y + r * self.tile_size
+
+            # ゴールやワープの下に床を描画
+            if self.code_floor_under[code] and normal_img:
+                surface.blit(normal_img, (x, y))
+
+            # タイル描画
+            img = code_images[code]
+            if img:
+                surface.blit(img, (x, y))
+
+            # 枠描画 (奈落以外)
+            if self.code_framed[code] and self.frame_image:
+                surface.blit(self.frame_image, (x, y))
 
         # 配置された駒の描画
         for p in self.placed_pieces:
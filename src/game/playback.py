@@ -0,0 +1,98 @@
+# d:/game/puzzle/src/game/playback.py
+# シミュレーションの録画
+# 開始時に決着まで一気にシミュレーションし、ステップごとの座標と向きを配列に記録して再生に使う
+# RELEVANT FILES: src/game/simulator.py, src/states/play.py
+
+from array import array
+
+from src.game.compiled_map import DIRECTIONS, DIR_INDEX
+from src.game.simulator import Simulator
+from src.game.trajectory import OUTCOME_LOOP
+
+# 決着の理由
+REASON_WIN = "WIN"  # 全員ゴール
+REASON_CRASH = "CRASH"  # 落下 / 衝突
+REASON_LOOP = "LOOP"  # 同じ状態を繰り返して決着しない (ループから抜けない駒がいる)
+REASON_STEP_LIMIT = "STEP_LIMIT"  # 上限ステップ数に達した
+
+
+class Playback:
+    def __init__(self, map_data, players_state, compiled=None, max_steps=None):
+        """
+        Args:
+            map_data: タイルIDの2次元リスト
+            players_state: プレイヤーの状態リスト (Simulator と同じ形式。書き換えない)
+            compiled: 同じマップから作成済みの CompiledMap
+            max_steps: 記録する最大ステップ数 (省略時は1人分の状態数。勝てる配置はこの中で決着する)
+        """
+        sim = Simulator(map_data, players_state, compiled=compiled)
+        if max_steps is None:
+            max_steps = sim.compiled.num_states
+
+        self.num_players = len(sim.players)
+        # ステップ t のプレイヤー i の値は [t * num_players + i]
+        self.xs = array("h")
+        self.ys = array("h")
+        self.directions = array("b")
+        self._record(sim)
+
+        # 駒同士の干渉は失敗にしかならないため、1人で動かしてループする駒がいれば負けが確定している。
+        # 全体の周期が長くても、その駒が1周を見せ終えた時点 (単独の結末が確定するステップ) で打ち切る
+        outcomes, solo_steps = sim.compiled.solo_outcomes()
+        loop_end = min(
+            (solo_steps[s] for s in sim.states if outcomes[s] == OUTCOME_LOOP),
+            default=max_steps,
+        )
+
+        # 無限ループ検知 (Brent 法、state_hash が一致した時だけ完全なキーで確かめる)
+        saved_hash = sim.state_hash
+        saved_key = sim.state_key()
+        power = 1
+        lam = 1
+        self.reason = REASON_STEP_LIMIT
+
+        while sim.steps < max_steps:
+            status = sim.step()
+            self._record(sim)
+            if status == "WIN":
+                self.reason = REASON_WIN
+                break
+            if status == "LOSE":
+                self.reason = REASON_CRASH
+                break
+
+            if sim.steps >= loop_end or (
+                sim.state_hash == saved_hash and sim.state_key() == saved_key
+            ):
+                self.reason = REASON_LOOP
+                break
+            if lam == power:
+                saved_hash = sim.state_hash
+                saved_key = sim.state_key()
+                power <<= 1
+                lam = 0
+            lam += 1
+
+        # 記録したステップ数と最終結果 (ループ / 上限到達も失敗として扱う)
+        self.num_steps = sim.steps
+        self.outcome = "WIN" if self.reason == REASON_WIN else "LOSE"
+
+    def _record(self, sim):
+        for p in sim.players:
+            self.xs.append(p["grid_x"])
+            self.ys.append(p["grid_y"])
+            self.directions.append(DIR_INDEX[p["piece"]["direction"]])
+
+    def status_at(self, step):
+        """ステップ step を終えた時点の status (記録の最後で outcome になる)"""
+        return self.outcome if step >= self.num_steps else "CONTINUE"
+
+    def position(self, step, index):
+        """ステップ step を終えた時点のプレイヤー index の (x, y)"""
+        k = min(max(step, 0), self.num_steps) * self.num_players + index
+        return self.xs[k], self.ys[k]
+
+    def direction(self, step, index):
+        """ステップ step を終えた時点のプレイヤー index の向き"""
+        k = min(max(step, 0), self.num_steps) * self.num_players + index
+        return DIRECTIONS[self.directions[k]]
@@ -0,0 +1,95 @@
+# d:/game/puzzle/src/game/prefetch.py
+# 次のステージの先読み
+# ステージの読み込み・TileMap の作成と画面へのフィット・画像の拡大・遷移表の作成をワーカースレッドで済ませておく
+# RELEVANT FILES: src/states/play.py, src/game/loader.py, src/game/map.py, src/game/stage_artifact.py
+
+import threading
+
+from src.const import SCREEN_WIDTH, SCREEN_HEIGHT, INVENTORY_WIDTH
+from src.game.map import TileMap
+from src.game.inventory import Inventory
+from src.game.compiled_map import CompiledMap
+
+# マップを収める領域 (画面幅 - インベントリ幅, ヘッダー分などを除いた高さ)
+PLAY_AREA_SIZE = (SCREEN_WIDTH - INVENTORY_WIDTH, SCREEN_HEIGHT - 100)
+
+
+class PreparedStage:
+    def __init__(self, level, stage_data, tile_map, inventory, compiled):
+        self.level = level
+        self.stage_data = stage_data
+        self.tile_map = tile_map  # fit_to_area 済み
+        self.inventory = inventory  # タイルサイズをマップに合わせ済み
+        self.compiled = compiled  # tile_map.map_data から作った CompiledMap
+
+
+def prepare_stage(loader, level, area_size=PLAY_AREA_SIZE):
+    """
+    ステージを読み込み、プレイ開始に必要なものをすべて作る
+    Raises:
+        FileNotFoundError / ValueError: StageLoader.load_stage と同じ
+    """
+    stage_data = loader.load_stage(level)
+    # コンパイル済みデータがあれば、有効範囲とワープの一覧は求め直さない
+    artifact = loader.load_artifact(level)
+    tile_map = TileMap(stage_data["map_data"])
+    tile_map.fit_to_area(
+        *area_size, bounds=artifact["content_bounds"] if artifact else None
+    )
+
+    inventory = Inventory(stage_data["players"][:])
+    inventory.set_tile_size(tile_map.tile_size, INVENTORY_WIDTH)
+
+    compiled = CompiledMap(
+        tile_map.map_data, warp_index=artifact["warp_index"] if artifact else None
+    )
+    return PreparedStage(level, stage_data, tile_map, inventory, compiled)
+
+
+class StagePrefetcher:
+    def __init__(self, loader, area_size=PLAY_AREA_SIZE):
+        """
+        Args:
+            loader: StageLoader (スレッドから呼ばれても安全なもの)
+            area_size: マップを収める領域 (幅, 高さ)
+        """
+        self.loader = loader
+        self.area_size = area_size
+        self._thread = None
+        self._level = None
+        # (レベル, PreparedStage。失敗時は None)。ワーカーが最後に書き込む
+        self._result = None
+
+    def start(self, level):
+        """level の準備をバックグラウンドで始める (同じレベルを準備中・準備済みなら何もしない)"""
+        if self._level == level:
+            return
+        self._level = level
+        self._result = None
+        self._thread = threading.Thread(target=self._worker, args=(level,), daemon=True)
+        self._thread.start()
+
+    def _worker(self, level):
+        try:
+            prepared = prepare_stage(self.loader, level, self.area_size)
+        except Exception as e:
+            print(f"Prefetch of level {level} failed: {e}")
+            prepared = None
+        # 待っている間に別のレベルの準備へ切り替わっていたら捨てる
+        if self._level == level:
+            self._result = (level, prepared)
+
+    def take(self, level):
+        """
+        準備済みのステージを受け取る
+        Returns:
+            PreparedStage。まだ終わっていない / 失敗した / 別のレベルを準備していた場合は None
+            (呼び出し側で prepare_stage を直接呼んで読み込む)
+        """
+        result = self._result
+        if result is None or result[0] != level:
+            return None
+        self._level = None
+        self._result = None
+        self._thread = None
+        return result[1]
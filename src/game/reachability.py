@@ -0,0 +1,53 @@
+# d:/game/puzzle/src/game/reachability.py
+# 1人配置の到達マップ
+# 通常マスごとに、そこへ駒を1つだけ置いた場合の結末 (ゴール / 落下 / ループ) とステップ数をまとめて求める
+# RELEVANT FILES: src/game/compiled_map.py, src/game/trajectory.py, src/states/dev.py
+
+from src.game.compiled_map import CompiledMap
+from src.game.tile_grid import CODE_NORMAL
+from src.game.trajectory import OUTCOME_GOAL, OUTCOME_PIT, OUTCOME_OUT, OUTCOME_LOOP
+
+
+def reachability_map(map_data, direction, compiled=None):
+    """
+    通常マスに向き direction の駒を1つだけ置いた場合の結末を、全マス分まとめて返す
+    (CompiledMap.solo_outcomes の表を引くだけなので、編集のたびに計算し直してよい)
+    Args:
+        map_data: タイルIDの2次元リスト
+        direction: 駒の向き ("up" など)
+        compiled: 同じマップから作成済みの CompiledMap
+    Returns:
+        list: map_data と同じ形の2次元リスト。
+              通常マスは (結末 OUTCOME_*, ステップ数)、それ以外は None
+    """
+    if compiled is None:
+        compiled = CompiledMap(map_data)
+    outcomes, steps = compiled.solo_outcomes()
+
+    codes = compiled.grid.codes
+    cols = compiled.cols
+    heatmap = []
+    for y in range(compiled.rows):
+        cells = []
+        for x in range(cols):
+            if codes[y * cols + x] == CODE_NORMAL:
+                state = compiled.pack(x, y, direction)
+                cells.append((outcomes[state], steps[state]))
+            else:
+                cells.append(None)
+        heatmap.append(cells)
+    return heatmap
+
+
+def summarize(heatmap):
+    """
+    到達マップの結末ごとのマス数 (難易度の目安)
+    Returns:
+        dict: {OUTCOME_*: マス数}
+    """
+    counts = {OUTCOME_GOAL: 0, OUTCOME_PIT: 0, OUTCOME_OUT: 0, OUTCOME_LOOP: 0}
+    for row in heatmap:
+        for cell in row:
+            if cell is not None:
+                counts[cell[0]] += 1
+    return counts
@@ -1,209 +1,312 @@
 # d:/game/puzzle/src/game/simulator.py
 # ゲームシミュレータークラス
 # マップとプレイヤーの移動ロジック、衝突判定、勝利/敗北判定を行う
-# RELEVANT FILES: src/const.py, src/game/map.py
+# RELEVANT FILES: src/game/compiled_map.py, src/game/map.py
 
-from src.const import (
-    TILE_GOAL,
-    TILE_UP,
-    TILE_DOWN,
-    TILE_RIGHT,
-    TILE_LEFT,
-    TILE_NULL,
-    TILE_PIT,  # 奈落ID (const.pyに追加が必要)
-)
+from collections import deque
+
+from src.game.compiled_map import CompiledMap, DIRECTIONS, DIR_DELTAS
 
 
 class Simulator:
-    def __init__(self, map_data, players_state):
+    def __init__(
+        self,
+        map_data,
+        players_state,
+        compiled=None,
+        checkpoint_interval=None,
+        max_checkpoints=64,
+    ):
         """
         Args:
             map_data: タイルIDの2次元リスト
             players_state: プレイヤーの状態リスト [{"grid_x": int, "grid_y": int, "piece": dict}, ...]
-                           (TileMap.placed_pieces と同じ形式を想定)
+                           (TileMap.placed_pieces と同じ形式を想定。書き換えずに写しを使う)
+            compiled: 同じマップから作成済みの CompiledMap (省略時はここで作成)
+            checkpoint_interval: 巻き戻し用のチェックポイントを取るステップ間隔
+                                 (省略時は取らず、seek / rewind は開始時点から進め直す)
+            max_checkpoints: 保持するチェックポイント数 (古いものから捨てる)
         """
         self.map_data = map_data
-        self.players = players_state
+        # 表示用のプレイヤー状態 (呼び出し側の辞書は書き換えない)
+        self.players = [dict(p) for p in players_state]
         self.status = "CONTINUE"  # CONTINUE, WIN, LOSE
-        self.rows = len(map_data)
-        self.cols = len(map_data[0]) if self.rows > 0 else 0
+        self.steps = 0  # 進めたステップ数
+        self.fallen = ()  # 直前のステップで落下したプレイヤーのインデックス
+        self.compiled = compiled if compiled is not None else CompiledMap(map_data)
+        self.rows = self.compiled.rows
+        self.cols = self.compiled.cols
+
+        # 各プレイヤーのパック状態 (遷移表のインデックス)
+        # シミュレーションの状態はこのリストと status / steps / fallen だけで決まる
+        self.states = [
+            self.compiled.pack(
+                p["grid_x"],
+                p["grid_y"],
+                p["piece"]["direction"],
+                p.get("waited_on_warp", False),
+            )
+            for p in self.players
+        ]
+        # 次の状態を書き込むバッファ (step のたびに self.states と入れ替える)
+        self._next_states = list(self.states)
+
+        # 全体状態の Zobrist ハッシュ (動いたプレイヤーの分だけ XOR で更新する)
+        self._zobrist_keys = self.compiled.zobrist_keys()
+        self._hash = self._full_hash()
+
+        # 衝突判定用の占有グリッド (セルごとに最後に書き込んだステップ番号を持つ)
+        # 毎ステップ番号を進めるだけで前のステップの印が無効になるため、クリア不要
+        self._stamp = 0
+        self._old_stamp = [0] * self.compiled.size  # 移動前にいたセル
+        self._old_owner = [0] * self.compiled.size  # 移動前にそのセルにいたプレイヤー
+        self._new_stamp = [0] * self.compiled.size  # 移動後に入るセル
+
+        # 巻き戻し用のチェックポイント (開始時点は常に残す。間隔の指定がなければ他は取らない)
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoints = deque(maxlen=max_checkpoints)
+        self._initial = self.snapshot()
+
+    @property
+    def state_hash(self):
+        """
+        全プレイヤーの (セル, 向き, 待機フラグ) から決まる 64bit のハッシュ。
+        並び順に依存しないため、ループ検知・置換表・キャッシュのキーに使える。
+        別の状態と衝突する可能性があるため、一致した時は state_key() で確認すること。
+        """
+        return self._hash
+
+    def state_key(self):
+        """state_hash が一致した時の確認用の、並び順に依存しない完全なキー"""
+        return tuple(sorted(self.states))
+
+    def _full_hash(self):
+        keys = self._zobrist_keys
+        h = 0
+        for state in self.states:
+            h ^= keys[state]
+        return h
+
+    def snapshot(self):
+        """
+        現在の状態を保存する (プレイヤー数に比例するコピーのみ)
+        Returns:
+            tuple: (パック状態のタプル, status, steps, fallen) restore に渡す
+        """
+        return (tuple(self.states), self.status, self.steps, self.fallen)
+
+    def restore(self, snapshot):
+        """snapshot で保存した状態に戻す"""
+        states, self.status, self.steps, self.fallen = snapshot
+        self.states = list(states)
+        self._hash = self._full_hash()
+        self._sync_players()
+
+    def seek(self, step):
+        """
+        指定したステップ数の状態に移動する。
+        そこより前で最も近いチェックポイントから進め直す (同じ配置なら結果は必ず同じ)。
+        Returns:
+            str: 移動後の status (途中で決着した場合はそのステップで止まる)
+        """
+        step = max(step, 0)
+        start = self._initial
+        for checkpoint in reversed(self.checkpoints):
+            if checkpoint[2] <= step:
+                start = checkpoint
+                break
+        if not (start[2] <= self.steps <= step):
+            self.restore(start)
+
+        while self.status == "CONTINUE" and self.steps < step:
+            self.fast_forward(step - self.steps)
+        return self.status
+
+    def rewind(self, steps=1):
+        """steps ステップ前の状態に戻す"""
+        return self.seek(self.steps - steps)
 
     def step(self):
         """シミュレーションを1ステップ進める"""
         if self.status != "CONTINUE":
             return self.status
 
-        # 1. 各プレイヤーの次の位置を計算
-        new_states = []
-
-        for i, p in enumerate(self.players):
-            current_x, current_y = p["grid_x"], p["grid_y"]
-            current_tile = self._get_tile_at(current_x, current_y)
-
-            # 状態更新用の一時辞書
-            state_update = {
-                "grid_x": current_x,
-                "grid_y": current_y,
-                "piece": p[
-                    "piece"
-                ].copy(),  # pieceも変更する可能性があるためコピー推奨 (方向転換)
-                "waited_on_warp": p.get(
-                    "waited_on_tile", False
-                ),  # 後方互換性のため一旦 waited_on_warp キーを使うが、意味は waited_on_tile
-                "just_warped": False,  # 今回のステップでワープしたか
-            }
-
-            # A. ワープ判定 (乗っていて、かつ待機済みフラグがない場合)
-            if current_tile.startswith("008") and not p.get("waited_on_warp", False):
-                # ワープ実行
-                target_pos = self._find_warp_target(current_tile, current_x, current_y)
-                if target_pos:
-                    state_update["grid_x"] = target_pos[0]
-                    state_update["grid_y"] = target_pos[1]
-                    state_update["waited_on_warp"] = True  # ワープ先で待機状態にする
-                    state_update["just_warped"] = True
-                else:
-                    # ワープ先が見つからない場合はその場に留まる（またはエラー？）
-                    pass
-
-            # B. 矢印判定 (乗っていて、かつ待機済みフラグがない場合)
-            elif current_tile in (
-                TILE_UP,
-                TILE_DOWN,
-                TILE_LEFT,
-                TILE_RIGHT,
-            ) and not p.get("waited_on_warp", False):
-                # 方向転換実行 (移動はしない)
-                if current_tile == TILE_UP:
-                    state_update["piece"]["direction"] = "up"
-                elif current_tile == TILE_DOWN:
-                    state_update["piece"]["direction"] = "down"
-                elif current_tile == TILE_RIGHT:
-                    state_update["piece"]["direction"] = "right"
-                elif current_tile == TILE_LEFT:
-                    state_update["piece"]["direction"] = "left"
-
-                state_update["waited_on_warp"] = True
-                # 座標は維持
-
-            # B. ゴール判定 (乗っていたら停止)
-            elif current_tile == TILE_GOAL:
-                # 移動しない
-                pass
-
-            # C. 通常移動
-            else:
-                nx, ny = self._get_next_pos(
-                    current_x, current_y, p["piece"]["direction"]
-                )
-
-                # 範囲外なら移動許可（後にLOSE判定になる）、範囲内のみ壁判定
-                if self._is_within_bounds(nx, ny):
-                    # 壁判定 (NULLは壁とみなす -> 移動しない)
-                    next_tile = self._get_tile_at(nx, ny)
-                    if next_tile == TILE_NULL:
-                        nx, ny = current_x, current_y  # 壁ドン停止
+        transitions = self.compiled.transitions
+        states = self.states
+        new_states = self._next_states
+        num_players = len(states)
+
+        # 1. 各プレイヤーの次の状態を遷移表から引く
+        keys = self._zobrist_keys
+        fallen = ()
+        for i in range(num_players):
+            state = states[i]
+            next_state = transitions[state]
+            if next_state < 0:
+                # マップ外 / 奈落 (位置は 3. で向いている方向へ1マス進める)
+                fallen += (i,)
+                next_state = state & ~1
+            if next_state != state:
+                self._hash ^= keys[state] ^ keys[next_state]
+            new_states[i] = next_state
+        lose = bool(fallen)
+
+        # 2. 衝突判定 (Player vs Player)
+        # 落下した場合はどのみち失敗なので調べない
+        if not lose and num_players > 1:
+            lose = self._collides(states, new_states)
+
+        self.steps += 1
+        return self._commit(states, new_states, lose, fallen)
+
+    def fast_forward(self, max_span=None):
+        """
+        次に何かが起きるところまでまとめて進める (ヘッドレス実行用)。
+        全員が通常マスを直進中で、その間に駒同士が接触しない場合だけ複数ステップを1回で進め、
+        それ以外は step と同じく1ステップ進める。結果は step を繰り返した場合と一致する。
+        Args:
+            max_span: 1回で進める最大ステップ数
+        """
+        if self.status != "CONTINUE":
+            return self.status
 
-                state_update["grid_x"] = nx
-                state_update["grid_y"] = ny
+        compiled = self.compiled
+        span = compiled.skippable_steps(self.states)
+        if max_span is not None:
+            span = min(span, max_span)
+        if span < 2:
+            return self.step()
+
+        states = self.states
+        new_states = self._next_states
+        keys = self._zobrist_keys
+        for i, state in enumerate(states):
+            next_state = compiled.advance_straight(state, span)
+            if next_state != state:
+                self._hash ^= keys[state] ^ keys[next_state]
+            new_states[i] = next_state
+
+        self.steps += span
+        return self._commit(states, new_states, False)
+
+    def run(self, max_steps):
+        """
+        決着がつくか max_steps ステップに達するまで fast_forward で進める
+        Returns:
+            str: 最終的な status (上限に達した場合は "CONTINUE")
+        """
+        while self.status == "CONTINUE" and self.steps < max_steps:
+            self.fast_forward(max_steps - self.steps)
+        return self.status
 
-                # ワープなどの待機フラグは移動を試みたらリセット
-                state_update["waited_on_warp"] = False
+    def _commit(self, states, new_states, lose, fallen=()):
+        """次の状態を確定し、表示用の状態と status に反映する"""
+        self.states = new_states
+        self._next_states = states
+        self.fallen = fallen
 
-            new_states.append(state_update)
+        # 3. 座標確定
+        goal_count = self._sync_players()
 
-        # 2. 衝突判定 & マップ外/奈落判定
-        # 判定結果を一時保存し、座標更新は必ず行う
-        next_status_candidate = "CONTINUE"
+        # 4. 勝利・敗北判定の確定
+        if lose:
+            self.status = "LOSE"
+        elif goal_count == len(new_states):
+            self.status = "WIN"
+        else:
+            self.status = "CONTINUE"
 
-        # 座標の検証 (マップ外と奈落)
-        for ns in new_states:
-            if not self._is_within_bounds(ns["grid_x"], ns["grid_y"]):
-                next_status_candidate = "LOSE"
+        # 一定間隔ごとと決着時にチェックポイントを取る
+        # (巻き戻して同じ区間を進め直した場合は、最新のものより後になるまで取らない)
+        if self.checkpoint_interval is not None:
+            last = self.checkpoints[-1][2] if self.checkpoints else 0
+            if self.steps - last >= self.checkpoint_interval or (
+                self.status != "CONTINUE" and self.steps > last
+            ):
+                self.checkpoints.append(self.snapshot())
 
-            tile_id = self._get_tile_at(ns["grid_x"], ns["grid_y"])
-            if tile_id == TILE_PIT:
-                next_status_candidate = "LOSE"
+        return self.status
 
-        # 衝突判定 (Player vs Player)
-        # 同じ座標に2人以上いるか
-        pos_counts = {}
-        for ns in new_states:
-            pos_key = (ns["grid_x"], ns["grid_y"])
-            pos_counts[pos_key] = pos_counts.get(pos_key, 0) + 1
-
-        for count in pos_counts.values():
-            if count > 1:
-                next_status_candidate = "LOSE"  # 衝突
-
-        # 正面衝突 (Swap) 判定
-        for i, ns in enumerate(new_states):
-            old_p = self.players[i]
-            old_pos = (old_p["grid_x"], old_p["grid_y"])
-            new_pos = (ns["grid_x"], ns["grid_y"])
-
-            for j, other_ns in enumerate(new_states):
-                if i == j:
-                    continue
-                other_old_p = self.players[j]
-                other_old_pos = (other_old_p["grid_x"], other_old_p["grid_y"])
-                other_new_pos = (other_ns["grid_x"], other_ns["grid_y"])
-
-                if old_pos == other_new_pos and new_pos == other_old_pos:
-                    next_status_candidate = "LOSE"  # 正面衝突
-
-        # 3. 座標確定とタイル効果適用
+    def _sync_players(self):
+        """
+        パック状態を表示用の辞書 (self.players) に書き出す
+        Returns:
+            int: ゴール上にいるプレイヤー数
+        """
+        cols = self.cols
+        goal_cells = self.compiled.goal_cells
         goal_count = 0
 
-        for i, ns in enumerate(new_states):
-            # 座標更新
-            self.players[i]["grid_x"] = ns["grid_x"]
-            self.players[i]["grid_y"] = ns["grid_y"]
-            self.players[i]["waited_on_warp"] = ns["waited_on_warp"]
-            self.players[i]["piece"] = ns["piece"]  # 方向転換の適用
+        for i, p in enumerate(self.players):
+            state = self.states[i]
+            cell = state >> 3
+            if i in self.fallen:
+                # 向いている方向へ1マス進んだ位置で失敗
+                dx, dy = DIR_DELTAS[(state >> 1) & 3]
+                p["grid_x"] = cell % cols + dx
+                p["grid_y"] = cell // cols + dy
+            else:
+                p["grid_x"] = cell % cols
+                p["grid_y"] = cell // cols
+            p["waited_on_warp"] = bool(state & 1)
 
-            # タイル効果適用
-            tile_id = self._get_tile_at(ns["grid_x"], ns["grid_y"])
+            direction = DIRECTIONS[(state >> 1) & 3]
+            if p["piece"]["direction"] != direction:
+                # 方向転換の適用 (元の駒データは書き換えない)
+                p["piece"] = dict(p["piece"], direction=direction)
 
             # ゴール判定（勝利条件チェック用）
-            if tile_id == TILE_GOAL:
+            if goal_cells[cell]:
                 goal_count += 1
 
-        # 4. 勝利・敗北判定の確定
-        if next_status_candidate == "LOSE":
-            self.status = "LOSE"
-        elif goal_count == len(self.players):
-            self.status = "WIN"
-        else:
-            self.status = "CONTINUE"
+        return goal_count
 
-        return self.status
+    def _collides(self, states, new_states):
+        """
+        同じセルに2人以上入る / 2人が位置を入れ替える (正面衝突) かを判定する。
+        占有グリッドに印を付けて調べるため、プレイヤー数に対して O(n)。
+        """
+        self._stamp += 1
+        stamp = self._stamp
+        old_stamp = self._old_stamp
+        old_owner = self._old_owner
+        new_stamp = self._new_stamp
+
+        # 移動前のセルに印を付ける
+        shared_start = False
+        for i, state in enumerate(states):
+            cell = state >> 3
+            if old_stamp[cell] == stamp:
+                shared_start = True  # 同じセルから始まる配置 (通常は起きない)
+            old_stamp[cell] = stamp
+            old_owner[cell] = i
 
-    def _get_next_pos(self, x, y, direction):
-        if direction == "up":
-            return x, y - 1
-        elif direction == "down":
-            return x, y + 1
-        elif direction == "left":
-            return x - 1, y
-        elif direction == "right":
-            return x + 1, y
-        return x, y
-
-    def _is_within_bounds(self, x, y):
-        return 0 <= x < self.cols and 0 <= y < self.rows
-
-    def _get_tile_at(self, x, y):
-        if self._is_within_bounds(x, y):
-            return self.map_data[y][x]
-        return TILE_NULL
-
-    def _find_warp_target(self, warp_id, current_x, current_y):
-        """指定されたワープIDのペアとなる座標を探す"""
-        for r in range(self.rows):
-            for c in range(self.cols):
-                if (r != current_y or c != current_x) and self.map_data[r][
-                    c
-                ] == warp_id:
-                    return (c, r)
-        return None
+        # 同じ座標に2人以上いるか
+        for state in new_states:
+            cell = state >> 3
+            if new_stamp[cell] == stamp:
+                return True  # 衝突
+            new_stamp[cell] = stamp
+
+        # 正面衝突 (Swap) 判定: 移動先に元々いたプレイヤーが、自分のいたセルへ来るか
+        if shared_start:
+            return self._swaps_pairwise(states, new_states)
+        for i, state in enumerate(states):
+            old_cell = state >> 3
+            new_cell = new_states[i] >> 3
+            if old_cell == new_cell or old_stamp[new_cell] != stamp:
+                continue
+            if new_states[old_owner[new_cell]] >> 3 == old_cell:
+                return True  # 正面衝突
+        return False
+
+    def _swaps_pairwise(self, states, new_states):
+        """正面衝突を全ペアで調べる (同じセルに複数人いる状態から始まった場合用)"""
+        num_players = len(states)
+        for i in range(num_players):
+            old_i = states[i] >> 3
+            new_i = new_states[i] >> 3
+            for j in range(i + 1, num_players):
+                if old_i == new_states[j] >> 3 and new_i == states[j] >> 3:
+                    return True
+        return False
@@ -1,75 +1,366 @@
 # d:/game/puzzle/src/game/solver.py
 # パズルソルバー
 # 与えられたマップとプレイヤー情報（向き）から、解（スタート位置の組み合わせ）を探索する
-# RELEVANT FILES: src/game/simulator.py, src/const.py
+# RELEVANT FILES: src/game/trajectory.py, src/game/compiled_map.py, src/game/engine.py
 
 import itertools
-import copy
-from src.game.simulator import Simulator
-from src.const import TILE_NORMAL, TILE_GOAL, SIM_STEP_DELAY
+import math
+import time
+from src.game.compiled_map import CompiledMap
+from src.game.engine import PackedEngine
+from src.game.trajectory import Trajectory, trajectories_conflict
+from src.game.tile_grid import CODE_NORMAL
 
 
 class Solver:
-    def __init__(self, map_data, players_templates, max_steps=100):
+    def __init__(self, map_data, players_templates, max_steps=None):
         """
         Args:
             map_data: タイルIDの2次元リスト
             players_templates: プレイヤー情報のリスト [{"direction": "up"}, ...] (座標は不要)
-            max_steps: シミュレーションの最大ステップ数（無限ループ防止の保険）
+            max_steps: シミュレーションの最大ステップ数
+                       (省略時はステージの状態数から決め、勝てる配置を途中で打ち切らない)
         """
         self.map_data = map_data
         self.players_templates = players_templates
-        self.max_steps = max_steps
         self.rows = len(map_data)
         self.cols = len(map_data[0]) if self.rows > 0 else 0
 
-    def solve(self, limit=2):
+        # 遷移表はステージごとに1回だけ作り、全ての配置で使い回す
+        self.compiled = CompiledMap(map_data)
+        self.engine = PackedEngine(self.compiled, max_steps)
+        self.max_steps = self.engine.max_steps
+
+        # 探索用のキャッシュ (駒ごとの候補 / 開始状態 -> 単独軌跡 / ペア -> 衝突するか)
+        self._piece_candidates = None
+        self._prev_same = []
+        self._completion_groups = []
+        self._trajectories = {}
+        self._conflict_cache = {}
+        # NumPy の一括判定エンジン (solve_batched で初めて作る)
+        self._batch_engine = None
+
+        # 探索の進捗 (iter_solutions で更新)
+        self.explored = 0
+        self.total = 0
+        self.search_status = "IDLE"
+
+    def solve(self, limit=2, workers=1):
         """
         解（クリア可能な配置パターン）を探索する。
         limit個見つかった時点で探索を打ち切り、そこまでの解リストを返す。
+        Args:
+            limit: 探索を打ち切る解の個数
+            workers: 2以上ならプロセスプールで先頭の駒の開始位置ごとに分割して探索する
+                     (結果はワーカー数に関わらず1プロセスの場合と同じ)
         Returns:
             list: 解のリスト。各要素は [{"grid_x":.., "piece":..}, ...] の形式。
         """
-        start_candidates = self._find_start_candidates()
-        num_players = len(self.players_templates)
-
-        if len(start_candidates) < num_players:
+        piece_candidates = self._prepare_search()
+        if piece_candidates is None:
             return []
 
-        found_solutions = []
+        num_first = len(piece_candidates[0])
+        if workers > 1 and num_first > 1:
+            placements = self._solve_parallel(limit, workers)
+        else:
+            placements = self._search(range(num_first), limit)
 
-        # 状態の一意性チェック用セット
-        # プレイヤーの順序に関わらず、(x,y,dir)の集合が同一なら同じ配置とみなす
-        seen_configs = set()
-
-        # 候補座標から人数分の順列を選ぶ（各駒に向きがあるため）
-        for positions in itertools.permutations(start_candidates, num_players):
-            # 配置を作成
-            current_config = []
-            for i, pos in enumerate(positions):
-                p_data = {
-                    "grid_x": pos[0],
-                    "grid_y": pos[1],
-                    "piece": {"direction": self.players_templates[i]["direction"]},
-                }
-                current_config.append(p_data)
-
-            # コンフィグのハッシュ化（重複チェック）
-            config_signature = frozenset(
-                (p["grid_x"], p["grid_y"], p["piece"]["direction"])
-                for p in current_config
-            )
+        return [self._to_config(placement) for placement in placements]
+
+    def iter_solutions(self, cancel=None, deadline=None, progress=None):
+        """
+        解を見つけた順に1つずつ返すジェネレータ (順序は solve と同じ)。
+        呼び出し側は必要な数だけ取り出して止めてよい (例: 2つ目で一意でないと判定)。
+        Args:
+            cancel: 中断用のトークン (threading.Event など is_set() を持つもの)
+            deadline: 打ち切り時刻 (time.monotonic() 基準の秒)
+            progress: 進捗コールバック progress(explored, total)
+                      explored は調べ終えた配置数、total は配置の総数
+        Yields:
+            list: [{"grid_x":.., "grid_y":.., "piece":..}, ...]
+        探索の終わり方は self.search_status に入る ("DONE", "CANCELLED", "TIMEOUT")
+        """
+        self.explored = 0
+        self.search_status = "RUNNING"
+
+        piece_candidates = self._prepare_search()
+        self.total = self._count_placements()
+        if piece_candidates is None:
+            self.search_status = "DONE"
+            if progress:
+                progress(0, 0)
+            return
+
+        def should_stop():
+            if progress:
+                progress(self.explored, self.total)
+            if cancel is not None and cancel.is_set():
+                self.search_status = "CANCELLED"
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                self.search_status = "TIMEOUT"
+                return True
+            return False
 
-            if config_signature in seen_configs:
+        for placement in self._iter_placements(
+            range(len(piece_candidates[0])), should_stop, track=True
+        ):
+            yield self._to_config(placement)
+
+        if self.search_status == "RUNNING":
+            self.search_status = "DONE"
+        if progress:
+            progress(self.explored, self.total)
+
+    def _to_config(self, placement):
+        """(x, y) のタプルを辞書形式の配置に変換"""
+        return [
+            {"grid_x": x, "grid_y": y, "piece": {"direction": t["direction"]}}
+            for t, (x, y) in zip(self.players_templates, placement)
+        ]
+
+    def _prepare_search(self):
+        """
+        駒ごとの開始候補と、その単独軌跡を用意する
+        Returns:
+            list | None: 駒ごとの候補リスト。どれかの駒に候補がなければ None
+        """
+        if self._piece_candidates is not None:
+            return self._piece_candidates
+
+        directions = [t["direction"] for t in self.players_templates]
+
+        # 駒ごとに、1人でゴールに着ける開始位置だけに絞り込む
+        # (他の駒との干渉は失敗にしかならないため、単独で着けない位置は解になり得ない)
+        viable_starts = {d: self.find_viable_starts(d) for d in set(directions)}
+        piece_candidates = [viable_starts[d] for d in directions]
+
+        if not piece_candidates or any(not c for c in piece_candidates):
+            return None
+
+        # 候補ごとの単独軌跡を1回だけ計算しておく
+        for candidates in viable_starts.values():
+            for _, _, state in candidates:
+                self._trajectories[state] = Trajectory(self.compiled, state)
+
+        # 同じ向きの駒は区別がないため、向きごとのグループ内では
+        # 候補インデックスが昇順になる組み合わせだけを作る (重複チェック不要)
+        # prev_same[i]: 駒 i より前にある同じ向きの駒 (なければ -1)
+        self._prev_same = []
+        last_by_direction = {}
+        for i, d in enumerate(directions):
+            self._prev_same.append(last_by_direction.get(d, -1))
+            last_by_direction[d] = i
+
+        # 進捗計算用: 駒 0..d-1 を置いた時点での向きごとの
+        # (候補数, そのグループで最後に置いた駒, 残りの駒数)
+        self._completion_groups = []
+        for depth in range(len(directions) + 1):
+            groups = {}
+            for i, d in enumerate(directions):
+                n, last, remaining = groups.get(d, (len(piece_candidates[i]), -1, 0))
+                if i < depth:
+                    last = i
+                else:
+                    remaining += 1
+                groups[d] = (n, last, remaining)
+            self._completion_groups.append(list(groups.values()))
+
+        self._piece_candidates = piece_candidates
+        return piece_candidates
+
+    def _count_placements(self, depth=-1, chosen_indices=()):
+        """
+        駒 0..depth を chosen_indices で置いた後に残る配置の数 (衝突は考慮しない)
+        depth=-1 なら配置の総数。向きごとに組み合わせの数を掛け合わせる。
+        """
+        if self._piece_candidates is None:
+            return 0
+
+        count = 1
+        for n, last, remaining in self._completion_groups[depth + 1]:
+            if last >= 0:
+                n -= chosen_indices[last] + 1
+            count *= math.comb(n, remaining)
+        return count
+
+    def _search(self, first_indices, limit, should_stop=None):
+        """
+        先頭の駒の候補インデックスを指定して探索し、最大 limit 個の解を返す
+        Returns:
+            list: 見つかった解 (探索順)。各要素は駒ごとの (x, y) のタプル
+        """
+        return list(
+            itertools.islice(self._iter_placements(first_indices, should_stop), limit)
+        )
+
+    def _iter_placements(
+        self, first_indices, should_stop=None, track=False, prune=True
+    ):
+        """
+        駒を先頭から順に置いていく深さ優先探索 (明示的なスタックで反復)。
+        既に置いた駒と軌跡がぶつかる候補はその場で除外する。
+        Args:
+            first_indices: 先頭の駒に使う候補インデックス (昇順)
+            should_stop: 開始時・一定ノードごと・解を返す直前と直後に呼ぶ関数。
+                         True を返したら探索を中断 (中断後は解を返さない)
+            track: True なら調べ終えた配置数を self.explored に加算する
+            prune: False なら軌跡の衝突で枝刈りせず、同じマスへの重複配置だけを除く
+                   (衝突の判定は呼び出し側のシミュレーションに任せる。solve_batched 用)
+        Yields:
+            tuple: 駒ごとの (x, y)
+        """
+        piece_candidates = self._piece_candidates
+        num_players = len(piece_candidates)
+        prev_same = self._prev_same
+        trajectories = self._trajectories
+        conflicts = self._conflicts
+
+        chosen = [None] * num_players  # 置いた候補 (x, y, state)
+        chosen_indices = [0] * num_players
+        next_index = [0] * num_players  # 深さごとの次に試す候補インデックス
+        first_indices = list(first_indices)
+        first_pos = 0
+        depth = 0
+        nodes = 0
+
+        # 開始前に中断・期限切れになっていれば何も返さない
+        if should_stop is not None and should_stop():
+            return
+
+        while True:
+            nodes += 1
+            if should_stop is not None and nodes % 1024 == 0 and should_stop():
+                return
+
+            if depth == 0:
+                if first_pos >= len(first_indices):
+                    return
+                k = first_indices[first_pos]
+                first_pos += 1
+            else:
+                k = next_index[depth]
+                if k >= len(piece_candidates[depth]):
+                    depth -= 1  # この深さの候補を使い切ったので戻る
+                    continue
+                next_index[depth] = k + 1
+
+            start = piece_candidates[depth][k]
+            state = start[2]
+            if prune:
+                blocked = any(
+                    conflicts(trajectories, state, chosen[j][2]) for j in range(depth)
+                )
+            else:
+                blocked = any(state >> 3 == chosen[j][2] >> 3 for j in range(depth))
+            if blocked:
+                if track:
+                    chosen_indices[depth] = k
+                    self.explored += self._count_placements(depth, chosen_indices)
                 continue
-            seen_configs.add(config_signature)
 
-            # シミュレーション実行
-            if self._run_simulation(current_config):
-                found_solutions.append(current_config)
-                if len(found_solutions) >= limit:
-                    break
+            chosen[depth] = start
+            chosen_indices[depth] = k
+
+            if depth == num_players - 1:
+                if track:
+                    self.explored += 1
+                if should_stop is not None and should_stop():
+                    return
+                yield tuple((x, y) for x, y, _ in chosen)
+                if should_stop is not None and should_stop():
+                    return
+                continue
+
+            depth += 1
+            prev = prev_same[depth]
+            next_index[depth] = chosen_indices[prev] + 1 if prev >= 0 else 0
+
+    def _solve_parallel(self, limit, workers):
+        """
+        先頭の駒の開始位置ごとにタスクを分け、プロセスプールで探索する。
+        各タスクの解を先頭インデックス順に連結するため、結果は逐次探索と一致する。
+        """
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+        num_first = len(self._piece_candidates[0])
+
+        # 打ち切り位置: このインデックスまでのタスクで limit 個揃ったら、それより後は不要
+        cutoff = multiprocessing.Value("i", num_first, lock=False)
+        results = {}
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self, cutoff),
+        ) as executor:
+            pending = {
+                executor.submit(_solve_task, first, limit): first
+                for first in range(num_first)
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+
+                # 先頭から連続して終わったタスクの解の数を数え、揃ったら打ち切り位置を下げる
+                total = 0
+                for first in range(num_first):
+                    if first not in results:
+                        break
+                    total += len(results[first])
+                    if total >= limit:
+                        cutoff.value = min(cutoff.value, first)
+                        break
+
+        found_solutions = []
+        for first in range(num_first):
+            if first > cutoff.value:
+                break
+            found_solutions.extend(results.get(first, []))
+        return found_solutions[:limit]
+
+    def solve_batched(self, limit=2, chunk_size=4096):
+        """
+        軌跡の比較を使わず、配置を chunk_size 個ずつ BatchEngine でまとめて
+        シミュレーションして解を探す。
+        NumPy が必要 (任意の依存。pip install ".[batch]" で入る)。
+        配置は solve と同じ _iter_placements で枝刈りせずに列挙するため、結果も solve と一致する。
+        Args:
+            limit: 探索を打ち切る解の個数
+            chunk_size: 1回の一括シミュレーションに渡す配置数
+        Returns:
+            list: solve と同じ形式の解のリスト
+        """
+        piece_candidates = self._prepare_search()
+        if piece_candidates is None:
+            return []
 
+        if self._batch_engine is None:
+            from src.game.batch_engine import BatchEngine
+
+            self._batch_engine = BatchEngine(self.compiled, self.max_steps)
+
+        # 配置は (x, y) で返るため、駒の向きと合わせて開始状態に戻す
+        pack = self.compiled.pack
+        directions = [t["direction"] for t in self.players_templates]
+
+        found_solutions = []
+        placements = self._iter_placements(range(len(piece_candidates[0])), prune=False)
+        for chunk in itertools.batched(placements, chunk_size):
+            wins = self._batch_engine.run(
+                [
+                    [pack(x, y, d) for (x, y), d in zip(placement, directions)]
+                    for placement in chunk
+                ]
+            )
+            for placement, win in zip(chunk, wins):
+                if win:
+                    found_solutions.append(self._to_config(placement))
+                    if len(found_solutions) >= limit:
+                        return found_solutions
         return found_solutions
 
     def count_solutions(self, limit=2):
@@ -78,60 +369,57 @@ class Solver:
 
     def _find_start_candidates(self):
         """配置可能な座標（通常タイルのみ）のリストを返す"""
-        candidates = []
-        for r in range(self.rows):
-            for c in range(self.cols):
-                tile = self.map_data[r][c]
-                # 配置できるのは通常タイルのみ
-                if tile == TILE_NORMAL:
-                    candidates.append((c, r))
-        return candidates
-
-    def _run_simulation(self, players_state):
-        """
-        1つの配置でシミュレーションを実行し、クリアできるか判定
-        Args:
-            players_state: [{"grid_x":, "grid_y":, "piece":...}, ...]
+        # 配置できるのは通常タイルのみ (行優先の順)
+        return self.compiled.grid.cells_with(CODE_NORMAL)
+
+    def _conflicts(self, trajectories, state_a, state_b):
+        """2つの開始状態の軌跡がぶつかるか (結果はペアごとにキャッシュ)"""
+        key = (state_a, state_b) if state_a < state_b else (state_b, state_a)
+        result = self._conflict_cache.get(key)
+        if result is None:
+            if state_a >> 3 == state_b >> 3:
+                result = True  # 同じマスには置けない
+            else:
+                result = trajectories_conflict(
+                    trajectories[state_a], trajectories[state_b]
+                )
+            self._conflict_cache[key] = result
+        return result
+
+    def find_viable_starts(self, direction):
+        """
+        指定した向きで置いた駒が、単独で max_steps 以内にゴールへ着ける開始位置を返す
         Returns:
-            bool: True if win, False otherwise
+            list: [(x, y, パック状態), ...] (_find_start_candidates と同じ順序)
         """
-        # シミュレーション用にディープコピー
-        sim_players = copy.deepcopy(players_state)
-        sim = Simulator(self.map_data, sim_players)
+        distances = self.compiled.goal_distances()
+        viable = []
+        for x, y in self._find_start_candidates():
+            state = self.compiled.pack(x, y, direction)
+            if 0 < distances[state] <= self.max_steps:
+                viable.append((x, y, state))
+        return viable
 
-        # 状態履歴（無限ループ検知用）
-        state_history = set()
 
-        for _ in range(self.max_steps):
-            # 現在の状態を記録
-            current_state_hash = self._hash_state(sim.players)
-            if current_state_hash in state_history:
-                return False  # 無限ループ
-            state_history.add(current_state_hash)
+# 並列探索のワーカープロセス側の状態 (プロセスごとに1回だけ受け取る)
+_worker_solver = None
+_worker_cutoff = None
 
-            status = sim.step()
 
-            if status == "WIN":
-                return True
-            if status == "LOSE":
-                return False
+def _init_worker(solver, cutoff):
+    """ワーカー起動時に、親でコンパイル済みのソルバーと打ち切り位置を受け取る"""
+    global _worker_solver, _worker_cutoff
+    _worker_solver = solver
+    _worker_cutoff = cutoff
 
-        return False  # ステップ切れでも失敗とみなす
 
-    def _hash_state(self, players):
-        """
-        プレイヤーの状態リストをハッシュ可能な形式に変換
-        順序に依存しないようにソートしてタプル化
-        """
-        p_list = []
-        for p in players:
-            item = (
-                p["grid_x"],
-                p["grid_y"],
-                p["piece"]["direction"],
-                p.get("waited_on_warp", False),
-            )
-            p_list.append(item)
+def _solve_task(first, limit):
+    """先頭の駒を first 番目の候補に固定した部分を探索する"""
+
+    # より前の分担で解が揃ったら中断
+    def should_stop():
+        return _worker_cutoff.value < first
 
-        p_list.sort()
-        return tuple(p_list)
+    if should_stop():
+        return []
+    return _worker_solver._search([first], limit, should_stop)
@@ -0,0 +1,250 @@
+# d:/game/puzzle/src/game/solver_cache.py
+# ソルバー結果のディスクキャッシュ
+# マップと駒の向きのハッシュをキーに、解のリスト・一意性の判定・探索の統計をファイルに保存する
+# RELEVANT FILES: src/game/solver.py, src/game/loader.py, src/states/dev.py
+
+import hashlib
+import json
+import os
+import time
+
+from src.game.fileutil import atomic_write
+from src.game.solver import Solver
+from src.game.tiles import rules_fingerprint
+
+# キャッシュ形式のバージョン
+# 保存する内容や、Simulator / CompiledMap の処理・ソルバーの探索順を変えたら上げること。
+# タイルの登録表 (src/game/tiles.py) の変更は cache_version に自動で反映される
+CACHE_VERSION = 1
+
+# 一意性の判定
+VERDICT_NO_SOLUTION = "NO_SOLUTION"
+VERDICT_UNIQUE = "UNIQUE"
+VERDICT_MULTIPLE = "MULTIPLE"
+VERDICT_UNKNOWN = "UNKNOWN"  # 探索を途中で止めたため確定していない
+
+INDEX_FILENAME = "index.json"
+
+
+def stage_hash(map_data, directions):
+    """
+    マップと駒の向きから、内容だけで決まるハッシュ (16進文字列) を求める
+    Args:
+        map_data: タイルIDの2次元リスト
+        directions: 駒の向きのリスト ["up", ...]
+    """
+    canonical = json.dumps(
+        {"map_data": map_data, "directions": list(directions)},
+        separators=(",", ":"),
+        ensure_ascii=True,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def cache_version():
+    """エントリに書くバージョン (形式のバージョン + タイルの規則の指紋)"""
+    return f"{CACHE_VERSION}-{rules_fingerprint()}"
+
+
+def run_search(solver, limit=2, cancel=None, progress=None):
+    """
+    解を limit 個まで探し、一意性を判定する
+    Args:
+        solver: 探索する Solver
+        limit: 探索を打ち切る解の個数 (2 なら一意性の判定に十分)
+        cancel: 中断用のトークン (Solver.iter_solutions に渡す)
+        progress: 進捗コールバック progress(explored, total)
+    Returns:
+        dict | None: {"solutions": [[[x, y], ...], ...], "complete": 全探索したか,
+                      "verdict": VERDICT_*, "stats": {"explored", "total", "elapsed"}}
+                     中断された場合は None
+    """
+    solutions = []
+    start = time.perf_counter()
+    for config in solver.iter_solutions(cancel=cancel, progress=progress):
+        solutions.append([[p["grid_x"], p["grid_y"]] for p in config])
+        if len(solutions) >= limit:
+            break
+    elapsed = time.perf_counter() - start
+
+    if solver.search_status == "CANCELLED":
+        return None
+
+    complete = solver.search_status == "DONE"
+    if len(solutions) >= 2:
+        verdict = VERDICT_MULTIPLE
+    elif not complete:
+        verdict = VERDICT_UNKNOWN
+    elif solutions:
+        verdict = VERDICT_UNIQUE
+    else:
+        verdict = VERDICT_NO_SOLUTION
+
+    return {
+        "solutions": solutions,
+        "complete": complete,
+        "verdict": verdict,
+        "stats": {
+            "explored": solver.explored,
+            "total": solver.total,
+            "elapsed": elapsed,
+        },
+    }
+
+
+class SolverCache:
+    def __init__(self, cache_dir=os.path.join(".cache", "solver")):
+        """
+        Args:
+            cache_dir: キャッシュを置くディレクトリ (エントリごとに <ハッシュ>.json)
+        """
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, map_data, templates, limit=2):
+        """
+        キャッシュ済みの結果を返す
+        Args:
+            map_data: タイルIDの2次元リスト
+            templates: 駒の情報のリスト [{"direction": "up"}, ...]
+            limit: 必要な解の個数 (保存された結果で足りない場合はミス扱い)
+        Returns:
+            dict | None: エントリ (check の戻り値と同じ形式)。なければ None
+        """
+        key = stage_hash(map_data, [t["direction"] for t in templates])
+        entry = self._read_entry(key)
+        if entry is None or not self._covers(entry, limit):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def check(self, map_data, templates, limit=2, cancel=None, progress=None):
+        """
+        キャッシュにあればそれを返し、なければ Solver で探索して保存する
+        Args:
+            map_data: タイルIDの2次元リスト
+            templates: 駒の情報のリスト [{"direction": "up"}, ...]
+            limit: 探索を打ち切る解の個数 (2 なら一意性の判定に十分)
+            cancel: 中断用のトークン (Solver.iter_solutions に渡す)
+            progress: 進捗コールバック progress(explored, total)
+        Returns:
+            dict | None: エントリ。中断された場合は保存せず None
+                {"version", "key", "solutions": [[[x, y], ...], ...],
+                 "complete": 全探索したか, "verdict": VERDICT_*,
+                 "stats": {"explored", "total", "elapsed"}}
+        """
+        entry = self.get(map_data, templates, limit)
+        if entry is not None:
+            return entry
+
+        result = run_search(Solver(map_data, templates), limit, cancel, progress)
+        if result is None:
+            return None
+
+        entry = {
+            "version": cache_version(),
+            "key": stage_hash(map_data, [t["direction"] for t in templates]),
+        }
+        entry.update(result)
+        self._write_json(self._entry_path(entry["key"]), entry)
+        return entry
+
+    def check_stage(self, path, limit=2):
+        """
+        ステージJSONファイルを検証する。
+        ファイルが編集されてハッシュが変わっていたら、以前のエントリを削除してから探索する。
+        Args:
+            path: ステージJSONのパス
+            limit: 探索を打ち切る解の個数
+        Returns:
+            dict: エントリ
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        map_data = data["map_data"]
+        templates = [{"direction": p["direction"]} for p in data["players"]]
+        key = stage_hash(map_data, [t["direction"] for t in templates])
+
+        index = self._read_index()
+        source = os.path.normpath(os.path.abspath(path))
+        old_key = index.get(source)
+        if old_key != key:
+            index[source] = key
+            if old_key is not None and old_key not in index.values():
+                self._remove_entry(old_key)
+            self._write_json(os.path.join(self.cache_dir, INDEX_FILENAME), index)
+
+        return self.check(map_data, templates, limit)
+
+    def prune(self):
+        """
+        古いバージョンのエントリと、削除されたステージファイルのエントリを消す
+        Returns:
+            int: 削除したエントリ数
+        """
+        if not os.path.isdir(self.cache_dir):
+            return 0
+
+        index = self._read_index()
+        live = {s: k for s, k in index.items() if os.path.exists(s)}
+        if live != index:
+            self._write_json(os.path.join(self.cache_dir, INDEX_FILENAME), live)
+        dropped = set(index.values()) - set(live.values())
+
+        removed = 0
+        for filename in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(filename)
+            if ext != ".json" or filename == INDEX_FILENAME:
+                continue
+            if key in dropped:
+                if self._remove_entry(key):
+                    removed += 1
+            elif self._read_entry(key) is None:
+                # 壊れている / バージョン違いのエントリは読み込み時に消える
+                removed += 1
+        return removed
+
+    def _covers(self, entry, limit):
+        """保存された結果で limit 個までの問い合わせに答えられるか"""
+        return entry["complete"] or len(entry["solutions"]) >= limit
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_entry(self, key):
+        """エントリを読み込む (存在しない / 壊れている / バージョン違いなら None)"""
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except OSError:
+            return None
+        except ValueError:
+            self._remove_entry(key)
+            return None
+        if entry.get("version") != cache_version() or entry.get("key") != key:
+            self._remove_entry(key)
+            return None
+        return entry
+
+    def _remove_entry(self, key):
+        try:
+            os.remove(self._entry_path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _read_index(self):
+        """ステージファイルのパス -> 最後に検証したハッシュ"""
+        try:
+            with open(
+                os.path.join(self.cache_dir, INDEX_FILENAME), "r", encoding="utf-8"
+            ) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_json(self, path, data):
+        atomic_write(path, json.dumps(data))
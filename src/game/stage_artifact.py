@@ -0,0 +1,159 @@
+# d:/game/puzzle/src/game/stage_artifact.py
+# ステージのコンパイル済みデータ
+# ステージごとに変わらない解析結果 (有効範囲・ワープの一覧・開始候補・解と一意性) を事前に求め、stages/compiled/ に保存する
+# RELEVANT FILES: src/game/loader.py, src/game/solver_cache.py, src/game/prefetch.py, src/cli.py
+#
+# 各ファイルはステージ内容のハッシュ (solver_cache.stage_hash) を持ち、
+# ステージが編集されてハッシュが変わったもの・タイルの規則が変わったものだけを compile_stages で作り直す。
+# 実行時 (StageLoader.load_artifact) は読むだけで、古い / ないものは None として扱う。
+
+import json
+import os
+
+from src.game.fileutil import atomic_write
+from src.game.solver_cache import stage_hash
+from src.game.tiles import rules_fingerprint
+
+# 形式のバージョン
+# 保存する内容や Simulator / CompiledMap の処理を変えたら上げること (古いファイルは作り直される)。
+# タイルの登録表の変更は artifact_version に自動で反映される
+ARTIFACT_VERSION = 1
+ARTIFACT_DIRNAME = "compiled"
+
+# compile_stages の結果
+STATUS_BUILT = "built"  # 作成 / 作り直し
+STATUS_FRESH = "fresh"  # 最新なのでそのまま
+STATUS_STALE = "stale"  # 古いが作り直していない (check_only)
+STATUS_REMOVED = "removed"  # ステージが削除されたので消した
+
+
+def artifact_version():
+    """ファイルに書くバージョン (形式のバージョン + タイルの規則の指紋)"""
+    return f"{ARTIFACT_VERSION}-{rules_fingerprint()}"
+
+
+def artifact_path(stages_dir, level):
+    return os.path.join(stages_dir, ARTIFACT_DIRNAME, f"{level}.json")
+
+
+def stage_key(stage_data):
+    """ステージ内容のハッシュ (マップと駒の向きだけで決まる)"""
+    return stage_hash(
+        stage_data["map_data"],
+        [p["direction"] for p in stage_data.get("players", [])],
+    )
+
+
+def compile_stage(stage_data, limit=2):
+    """
+    ステージを解析してコンパイル済みデータを作る
+    Args:
+        stage_data: ステージデータ (StageLoader.load_stage と同じ形式)
+        limit: 探索を打ち切る解の個数 (2 なら一意性の判定に十分)
+    Returns:
+        dict: {"version", "key",
+               "content_bounds": [最小列, 最小行, 最大列, 最大行] (TileMap.fit_to_area 用),
+               "warp_index": {ワープID: [[x, y], ...]} (CompiledMap 用),
+               "start_candidates": {向き: [[x, y], ...]} (1人でゴールに着ける開始位置),
+               "solutions", "complete", "verdict" (solver_cache.run_search と同じ),
+               "stats": {"explored", "total"}}
+            再作成しても内容が変わらないよう、探索時間 (stats.elapsed) は保存しない
+    """
+    from src.game.solver import Solver
+    from src.game.solver_cache import run_search
+
+    directions = [p["direction"] for p in stage_data["players"]]
+    solver = Solver(stage_data["map_data"], [{"direction": d} for d in directions])
+    compiled = solver.compiled
+
+    artifact = {
+        "version": artifact_version(),
+        "key": stage_key(stage_data),
+        "content_bounds": list(compiled.grid.content_bounds()),
+        "warp_index": {
+            warp_id: [[x, y] for x, y in cells]
+            for warp_id, cells in compiled.warp_index.items()
+        },
+        "start_candidates": {
+            d: [[x, y] for x, y, _ in solver.find_viable_starts(d)]
+            for d in sorted(set(directions))
+        },
+    }
+    result = run_search(solver, limit)
+    del result["stats"]["elapsed"]
+    artifact.update(result)
+    return artifact
+
+
+def read_artifact(path, key=None):
+    """
+    コンパイル済みデータを読む
+    Args:
+        key: ステージ内容のハッシュ。指定すると一致しないもの (古いもの) は None
+    Returns:
+        dict | None: ない / 壊れている / バージョン違い / 古い場合は None
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            artifact = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(artifact, dict) or artifact.get("version") != artifact_version():
+        return None
+    if key is not None and artifact.get("key") != key:
+        return None
+    # JSON の [x, y] を build_warp_index と同じタプルに戻す
+    try:
+        artifact["warp_index"] = {
+            warp_id: [tuple(cell) for cell in cells]
+            for warp_id, cells in artifact["warp_index"].items()
+        }
+    except (KeyError, TypeError, AttributeError):
+        return None
+    return artifact
+
+
+def write_artifact(path, artifact):
+    atomic_write(path, json.dumps(artifact))
+
+
+def compile_stages(loader, force=False, check_only=False, limit=2):
+    """
+    ステージディレクトリの全ステージをコンパイルする (内容が変わったものだけ作り直す)
+    Args:
+        loader: 対象ディレクトリの StageLoader (JSON とバンドルの両方を読む)
+        force: 最新のものも作り直す
+        check_only: 書き込まず、古いものを STATUS_STALE として報告するだけにする
+        limit: 探索を打ち切る解の個数
+    Returns:
+        list: [(レベル, STATUS_*, コンパイル済みデータ | None), ...] (レベル順)
+    """
+    stages_dir = loader.stages_dir
+    levels = loader.get_available_levels()
+    results = []
+    for level in levels:
+        stage_data = loader.load_stage(level)
+        path = artifact_path(stages_dir, level)
+        artifact = None if force else read_artifact(path, stage_key(stage_data))
+        if artifact is not None:
+            results.append((level, STATUS_FRESH, artifact))
+        elif check_only:
+            results.append((level, STATUS_STALE, None))
+        else:
+            artifact = compile_stage(stage_data, limit)
+            write_artifact(path, artifact)
+            results.append((level, STATUS_BUILT, artifact))
+
+    # 削除されたステージの分を消す
+    compiled_dir = os.path.join(stages_dir, ARTIFACT_DIRNAME)
+    if os.path.isdir(compiled_dir):
+        live = set(levels)
+        for filename in sorted(os.listdir(compiled_dir)):
+            level, ext = os.path.splitext(filename)
+            if ext == ".json" and level.isdigit() and int(level) not in live:
+                if check_only:
+                    results.append((int(level), STATUS_STALE, None))
+                else:
+                    os.remove(os.path.join(compiled_dir, filename))
+                    results.append((int(level), STATUS_REMOVED, None))
+    return results
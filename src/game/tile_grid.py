@@ -0,0 +1,144 @@
+# d:/game/puzzle/src/game/tile_grid.py
+# 整数コードのタイルグリッド
+# 文字列のタイルID ("00200" など) を読み込み時に1回だけ小さな整数コードへ変換し、行優先の bytearray に詰めて持つ
+# RELEVANT FILES: src/const.py, src/game/compiled_map.py, src/game/map.py, src/game/solver.py
+#
+# JSON の読み書きは従来どおり文字列の2次元リスト (map_data) で行い、
+# マップを調べる処理 (遷移表の作成・描画・配置候補の列挙など) は TileGrid のコードを読む。
+
+import threading
+
+from src.const import (
+    TILE_NULL,
+    TILE_PIT,
+    TILE_NORMAL,
+    TILE_GOAL,
+    TILE_UP,
+    TILE_DOWN,
+    TILE_RIGHT,
+    TILE_LEFT,
+    TILE_WARP,
+)
+
+# コード -> タイルID / タイルID -> コード (未知のIDは初めて見た時に末尾へ追加する)
+_TILE_IDS = []
+_TILE_CODES = {}
+# 先読みスレッド (src/game/prefetch.py) とメインスレッドが同時に TileGrid を作るため、追加はロックして行う
+_lock = threading.Lock()
+
+MAX_TILE_CODES = 256  # bytearray の1要素に収まる数
+
+
+def intern_tile(tile_id):
+    """
+    タイルIDのコードを返す (初めてのIDには新しいコードを割り当てる)
+    Raises:
+        ValueError: コードが 256 種類を超える場合
+    """
+    code = _TILE_CODES.get(tile_id)
+    if code is not None:
+        return code
+    with _lock:
+        code = _TILE_CODES.get(tile_id)
+        if code is None:
+            if len(_TILE_IDS) >= MAX_TILE_CODES:
+                raise ValueError(f"Too many distinct tile IDs: {tile_id!r}")
+            code = len(_TILE_IDS)
+            _TILE_IDS.append(tile_id)
+            _TILE_CODES[tile_id] = code
+        return code
+
+
+def tile_id_of(code):
+    """コード -> タイルID"""
+    return _TILE_IDS[code]
+
+
+def num_tile_codes():
+    """割り当て済みのコード数 (コードごとの表を作る時の大きさ)"""
+    return len(_TILE_IDS)
+
+
+# 標準のタイルは常に同じコードになるよう、最初に登録しておく
+CODE_NULL = intern_tile(TILE_NULL)
+CODE_PIT = intern_tile(TILE_PIT)
+CODE_NORMAL = intern_tile(TILE_NORMAL)
+CODE_GOAL = intern_tile(TILE_GOAL)
+CODE_UP = intern_tile(TILE_UP)
+CODE_DOWN = intern_tile(TILE_DOWN)
+CODE_RIGHT = intern_tile(TILE_RIGHT)
+CODE_LEFT = intern_tile(TILE_LEFT)
+CODE_WARP = intern_tile(TILE_WARP)
+for _warp_id in ("00801", "00802", "00803"):
+    intern_tile(_warp_id)
+
+
+class TileGrid:
+    def __init__(self, map_data):
+        """
+        Args:
+            map_data: タイルIDの2次元リスト
+        """
+        self.rows = len(map_data)
+        self.cols = len(map_data[0]) if self.rows > 0 else 0
+        # 行優先 (セル番号 = y * cols + x)。1セル1バイト
+        self.codes = bytearray(intern_tile(t) for row in map_data for t in row)
+
+    def code_at(self, x, y):
+        return self.codes[y * self.cols + x]
+
+    def tile_id_at(self, x, y):
+        return _TILE_IDS[self.codes[y * self.cols + x]]
+
+    def set_tile(self, x, y, tile_id):
+        self.codes[y * self.cols + x] = intern_tile(tile_id)
+
+    def cells_with(self, code):
+        """コードが code のセルの (x, y) のリスト (行優先の順)"""
+        cols = self.cols
+        return [
+            (cell % cols, cell // cols)
+            for cell, c in enumerate(self.codes)
+            if c == code
+        ]
+
+    def content_bounds(self):
+        """
+        奈落・壁以外のタイルを囲む範囲 (なければマップ全体)
+        Returns:
+            tuple: (最小列, 最小行, 最大列, 最大行)
+        """
+        cols = self.cols
+        min_c, max_c = cols, -1
+        min_r, max_r = self.rows, -1
+        for cell, code in enumerate(self.codes):
+            if code != CODE_PIT and code != CODE_NULL:
+                r, c = divmod(cell, cols)
+                if r < min_r:
+                    min_r = r
+                if r > max_r:
+                    max_r = r
+                if c < min_c:
+                    min_c = c
+                if c > max_c:
+                    max_c = c
+
+        if max_r < 0:
+            # 有効タイルがない場合は全体を有効とする
+            return 0, 0, cols - 1, self.rows - 1
+        return min_c, min_r, max_c, max_r
+
+    def to_map_data(self):
+        """JSON 保存用の文字列の2次元リストに戻す"""
+        cols = self.cols
+        return [
+            [_TILE_IDS[c] for c in self.codes[r * cols : (r + 1) * cols]]
+            for r in range(self.rows)
+        ]
+
+
+def as_tile_grid(map_data):
+    """文字列の2次元リストなら TileGrid に変換し、TileGrid ならそのまま返す"""
+    if isinstance(map_data, TileGrid):
+        return map_data
+    return TileGrid(map_data)
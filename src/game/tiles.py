@@ -0,0 +1,195 @@
+# d:/game/puzzle/src/game/tiles.py
+# タイルの規則の登録表
+# タイルIDごとに種類 (KIND_*) と振る舞い (1ステップの遷移関数) を登録し、CompiledMap はこの表だけを引いて遷移表を作る
+# RELEVANT FILES: src/game/compiled_map.py, src/game/tile_grid.py, src/const.py
+#
+# 新しいタイル (ベルトコンベア / 氷 / 一方通行など) は register_tile で登録するだけでよく、
+# 遷移表の作成処理やシミュレーションのループを変更する必要はない。
+
+import hashlib
+import json
+import threading
+
+from src.const import (
+    TILE_NULL,
+    TILE_PIT,
+    TILE_GOAL,
+    TILE_UP,
+    TILE_DOWN,
+    TILE_RIGHT,
+    TILE_LEFT,
+)
+from src.game.tile_grid import tile_id_of
+
+# 隣のセルからこのタイルに入ろうとした時の扱い
+ENTER_OK = 0  # 入れる
+ENTER_BLOCKED = 1  # 入れずにその場に留まる (壁)
+ENTER_FATAL = 2  # 落下して失敗 (奈落)
+
+
+class TileRule:
+    def __init__(self, name, step=None, param=None, enter=ENTER_OK, goal=False):
+        """
+        Args:
+            name: 種類の名前 (表示・デバッグ用)
+            step: 遷移関数 step(compiled, state, param) -> 次のパック状態 (失敗時は FATAL_*)。
+                  省略時は通常移動 (move)。入ってきた向きは state の向き ((state >> 1) & 3)
+            param: セルごとの付加情報を求める関数 param(compiled, tile_id, x, y) -> int。
+                   省略時は -1
+            enter: 隣から入ろうとした時の扱い (ENTER_*)。入る向きで変える場合は
+                   移動の向きごとの4要素のタプル (compiled_map.DIRECTIONS の順: 上, 下, 左, 右)
+            goal: ゴールとして数えるか
+        """
+        self.name = name
+        self.step = step or move
+        self.param = param
+        # 常に向きごとのタプルで持つ (CompiledMap は enter[向き] を引くだけ)
+        self.enter = tuple(enter) if isinstance(enter, (tuple, list)) else (enter,) * 4
+        self.goal = goal
+
+
+# 種類の番号 -> TileRule (CompiledMap.kinds の値がそのまま添字になる)
+TILE_RULES = []
+# タイルID -> 種類の番号
+_TILE_KINDS = {}
+# (IDの接頭辞, 種類の番号) ワープのように複数のIDで同じ振る舞いをするタイル用
+_TILE_PREFIXES = []
+# タイルコード (tile_grid) -> 種類の番号 (必要になった分だけ埋める。登録が増えたら作り直す)
+_KIND_BY_CODE = []
+# _KIND_BY_CODE を埋める処理は先読みスレッドとメインスレッドから同時に呼ばれるためロックする
+_kind_lock = threading.Lock()
+# 登録内容の指紋 (rules_fingerprint。登録が増えたら作り直す)
+_fingerprint = None
+
+
+def register_tile(rule, tile_ids=(), prefix=None):
+    """
+    タイルの規則を登録する
+    Args:
+        rule: TileRule
+        tile_ids: この規則を使うタイルIDのリスト
+        prefix: この接頭辞で始まるIDにも使う (完全一致の登録が優先)
+    Returns:
+        int: 種類の番号
+    """
+    global _fingerprint
+
+    kind = len(TILE_RULES)
+    TILE_RULES.append(rule)
+    for tile_id in tile_ids:
+        _TILE_KINDS[tile_id] = kind
+    if prefix is not None:
+        _TILE_PREFIXES.append((prefix, kind))
+    with _kind_lock:
+        _KIND_BY_CODE.clear()
+    _fingerprint = None
+    return kind
+
+
+def tile_kind(tile_id):
+    """タイルIDの種類の番号 (登録されていないIDは通常マス)"""
+    kind = _TILE_KINDS.get(tile_id)
+    if kind is not None:
+        return kind
+    for prefix, kind in _TILE_PREFIXES:
+        if tile_id.startswith(prefix):
+            return kind
+    return KIND_FLOOR
+
+
+def code_kind(code):
+    """タイルコードの種類の番号 (文字列の照合はコードごとに1回だけ)"""
+    if code < len(_KIND_BY_CODE):
+        return _KIND_BY_CODE[code]
+    with _kind_lock:
+        while len(_KIND_BY_CODE) <= code:
+            _KIND_BY_CODE.append(tile_kind(tile_id_of(len(_KIND_BY_CODE))))
+        return _KIND_BY_CODE[code]
+
+
+def rules_fingerprint():
+    """
+    登録されている規則の指紋 (16進文字列)
+    タイルIDの割り当て・振る舞い・入れるかどうか・ゴールかどうかのどれかが変わると値も変わる。
+    解析結果を保存するキャッシュ (solver_cache / stage_artifact) のバージョンに含める
+    """
+    global _fingerprint
+
+    if _fingerprint is None:
+        entries = []
+        for kind, rule in enumerate(TILE_RULES):
+            entries.append(
+                {
+                    "name": rule.name,
+                    "step": rule.step.__name__,
+                    "param": rule.param.__name__ if rule.param else None,
+                    # 向きによらない規則は1つの値のままにする (保存済みのキャッシュを無効にしない)
+                    "enter": (
+                        rule.enter[0] if len(set(rule.enter)) == 1 else list(rule.enter)
+                    ),
+                    "goal": rule.goal,
+                    "tile_ids": sorted(t for t, k in _TILE_KINDS.items() if k == kind),
+                    "prefixes": [p for p, k in _TILE_PREFIXES if k == kind],
+                }
+            )
+        canonical = json.dumps(entries, separators=(",", ":"), sort_keys=True)
+        _fingerprint = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+    return _fingerprint
+
+
+# --- 振る舞い ---
+
+
+def move(compiled, state, param=-1):
+    """向いている方向へ1マス進む (待機フラグはリセット)"""
+    next_cell = compiled.moves[state >> 1]
+    if next_cell < 0:
+        return next_cell
+    return (next_cell << 3) | (state & 6)
+
+
+def stay(compiled, state, param=-1):
+    """その場で停止する"""
+    return state & ~1
+
+
+def turn(compiled, state, param):
+    """矢印: 乗った次のステップで向きだけ変え、その次のステップで進む"""
+    if state & 1:
+        return move(compiled, state)
+    return (state >> 3 << 3) | (param << 1) | 1
+
+
+def warp(compiled, state, param):
+    """ワープ: ペアのセルへ移り、移った先では1ステップ待機する"""
+    if state & 1:
+        return move(compiled, state)
+    if param >= 0:
+        return (param << 3) | (state & 6) | 1
+    # ワープ先が見つからない場合はその場に留まる
+    return state & ~1
+
+
+# 矢印タイルの向き (compiled_map.DIRECTIONS の添字)
+ARROW_DIRECTIONS = {TILE_UP: 0, TILE_DOWN: 1, TILE_LEFT: 2, TILE_RIGHT: 3}
+
+
+def arrow_param(compiled, tile_id, x, y):
+    return ARROW_DIRECTIONS[tile_id]
+
+
+def warp_param(compiled, tile_id, x, y):
+    return compiled._warp_target(tile_id, x, y)
+
+
+# --- 標準のタイル ---
+# 種類の番号は登録順 (KIND_FLOOR は未登録IDの既定値なので最初に登録する)
+
+KIND_FLOOR = register_tile(TileRule("floor"))
+KIND_NULL = register_tile(TileRule("null", enter=ENTER_BLOCKED), [TILE_NULL])
+KIND_PIT = register_tile(TileRule("pit", enter=ENTER_FATAL), [TILE_PIT])
+KIND_GOAL = register_tile(TileRule("goal", step=stay, goal=True), [TILE_GOAL])
+KIND_ARROW = register_tile(
+    TileRule("arrow", step=turn, param=arrow_param), list(ARROW_DIRECTIONS)
+)
+KIND_WARP = register_tile(TileRule("warp", step=warp, param=warp_param), prefix="008")
@@ -0,0 +1,181 @@
+# d:/game/puzzle/src/game/trace.py
+# シミュレーションのバイナリトレース
+# 録画 (Playback) をステージのハッシュ・初期配置・ステップごとの位置・結果と一緒に固定長レコードで保存し、コピーせずに再生する
+# RELEVANT FILES: src/game/playback.py, src/game/solver_cache.py, src/states/play.py, src/states/attract.py
+#
+# 形式 (リトルエンディアン、1ファイルに複数のトレースを連結できる):
+#   ヘッダー 46 バイト: マジック "LTRC", バージョン, 結果, 決着の理由, 予約,
+#                       駒数 (u16), ステップ数 (u32), ステージのハッシュ (sha256, 32 バイト)
+#   レコード 3 バイト × (ステップ数 + 1) × 駒数: x, y, 向き (DIRECTIONS の添字)
+#     (すべて符号付き 8 ビット。マップ外に落ちた駒の座標は負になりうる)
+#   ステップ 0 のレコードが初期配置になる
+
+import mmap
+import struct
+
+from src.game.compiled_map import DIRECTIONS, DIR_INDEX
+from src.game.playback import (
+    Playback,
+    REASON_WIN,
+    REASON_CRASH,
+    REASON_LOOP,
+    REASON_STEP_LIMIT,
+)
+
+TRACE_MAGIC = b"LTRC"
+TRACE_VERSION = 1
+
+HEADER = struct.Struct("<4sBBBxHI32s")
+RECORD_SIZE = 3
+
+REASONS = (REASON_WIN, REASON_CRASH, REASON_LOOP, REASON_STEP_LIMIT)
+REASON_INDEX = {r: i for i, r in enumerate(REASONS)}
+
+
+def encode_trace(playback, key):
+    """
+    録画をトレースのバイト列にする
+    Args:
+        playback: Playback (または Trace)
+        key: ステージのハッシュ (solver_cache.stage_hash の16進文字列)
+    Returns:
+        bytes
+    """
+    n = playback.num_players
+    steps = playback.num_steps
+    data = bytearray(HEADER.size + (steps + 1) * n * RECORD_SIZE)
+    HEADER.pack_into(
+        data,
+        0,
+        TRACE_MAGIC,
+        TRACE_VERSION,
+        1 if playback.outcome == "WIN" else 0,
+        REASON_INDEX[playback.reason],
+        n,
+        steps,
+        bytes.fromhex(key),
+    )
+
+    records = memoryview(data)[HEADER.size :].cast("b")
+    offset = 0
+    for step in range(steps + 1):
+        for i in range(n):
+            x, y = playback.position(step, i)
+            if not (-128 <= x < 128 and -128 <= y < 128):
+                raise ValueError(f"Position out of trace range: ({x}, {y})")
+            records[offset] = x
+            records[offset + 1] = y
+            records[offset + 2] = DIR_INDEX[playback.direction(step, i)]
+            offset += RECORD_SIZE
+    records.release()
+    return bytes(data)
+
+
+def record_trace(map_data, players_state, compiled=None):
+    """
+    配置を決着までシミュレーションしてトレースを作る
+    Args:
+        map_data: タイルIDの2次元リスト
+        players_state: プレイヤーの状態リスト (Simulator と同じ形式)
+        compiled: 同じマップから作成済みの CompiledMap
+    Returns:
+        Trace
+    """
+    from src.game.solver_cache import stage_hash
+
+    key = stage_hash(map_data, [p["piece"]["direction"] for p in players_state])
+    playback = Playback(map_data, players_state, compiled=compiled)
+    return Trace(encode_trace(playback, key))
+
+
+class Trace:
+    def __init__(self, buffer, offset=0):
+        """
+        バッファ上のトレースを読む (データはコピーせず memoryview で参照する)
+        Args:
+            buffer: bytes / bytearray / mmap など
+            offset: トレースの先頭位置
+        Raises:
+            ValueError: トレースの形式が正しくない場合
+        """
+        view = memoryview(buffer)
+        if len(view) - offset < HEADER.size:
+            raise ValueError("Truncated trace header")
+        magic, version, won, reason, n, steps, digest = HEADER.unpack_from(view, offset)
+        if magic != TRACE_MAGIC:
+            raise ValueError("Not a trace (bad magic)")
+        if version != TRACE_VERSION:
+            raise ValueError(f"Unsupported trace version: {version}")
+        if reason >= len(REASONS):
+            raise ValueError(f"Unknown trace reason: {reason}")
+
+        self.num_players = n
+        self.num_steps = steps
+        self.outcome = "WIN" if won else "LOSE"
+        self.reason = REASONS[reason]
+        self.key = digest.hex()
+
+        self.nbytes = HEADER.size + (steps + 1) * n * RECORD_SIZE
+        if len(view) - offset < self.nbytes:
+            raise ValueError("Truncated trace records")
+        self._view = view[offset : offset + self.nbytes]
+        self._records = self._view[HEADER.size :].cast("b")
+
+    # --- Playback と同じ読み出し ---
+
+    def status_at(self, step):
+        """ステップ step を終えた時点の status (記録の最後で outcome になる)"""
+        return self.outcome if step >= self.num_steps else "CONTINUE"
+
+    def position(self, step, index):
+        """ステップ step を終えた時点のプレイヤー index の (x, y)"""
+        k = min(max(step, 0), self.num_steps) * self.num_players + index
+        base = k * RECORD_SIZE
+        return self._records[base], self._records[base + 1]
+
+    def direction(self, step, index):
+        """ステップ step を終えた時点のプレイヤー index の向き"""
+        k = min(max(step, 0), self.num_steps) * self.num_players + index
+        return DIRECTIONS[self._records[k * RECORD_SIZE + 2]]
+
+    def initial_players(self):
+        """初期配置 (Simulator / TileMap.place_piece に渡す形式)"""
+        players = []
+        for i in range(self.num_players):
+            x, y = self.position(0, i)
+            players.append(
+                {"grid_x": x, "grid_y": y, "piece": {"direction": self.direction(0, i)}}
+            )
+        return players
+
+    def to_bytes(self):
+        return bytes(self._view)
+
+
+def iter_traces(buffer):
+    """連結されたトレースを先頭から順に返す"""
+    offset = 0
+    size = len(memoryview(buffer))
+    while offset < size:
+        trace = Trace(buffer, offset)
+        offset += trace.nbytes
+        yield trace
+
+
+def load_traces(path):
+    """
+    トレースファイルを mmap で開き、含まれるトレースのリストを返す
+    (レコードはファイルのページを直接参照する)
+    """
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return []
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return list(iter_traces(mapped))
+
+
+def append_traces(path, traces):
+    """トレースをファイルの末尾に追記する"""
+    with open(path, "ab") as f:
+        for trace in traces:
+            f.write(trace.to_bytes())
@@ -0,0 +1,99 @@
+# d:/game/puzzle/src/game/trajectory.py
+# 駒1つ分の軌跡
+# 単独で動かした場合の通過セル・結末・ループ開始点を前計算し、駒同士の干渉を軌跡の比較だけで判定する
+# RELEVANT FILES: src/game/compiled_map.py, src/game/solver.py
+
+from src.game.compiled_map import FATAL_PIT
+
+# 単独で動かした場合の結末
+OUTCOME_GOAL = "GOAL"  # ゴールに着いて停止
+OUTCOME_PIT = "PIT"  # 奈落に落ちた
+OUTCOME_OUT = "OUT"  # マップ外に出た
+OUTCOME_LOOP = "LOOP"  # 同じ状態を繰り返す
+
+
+class Trajectory:
+    def __init__(self, compiled, start_state):
+        """
+        Args:
+            compiled: CompiledMap
+            start_state: 開始時のパック状態
+        """
+        self.start_state = start_state
+
+        # 時刻 t (0 から) ごとのセル番号
+        # ゴールに着いた後はゴールのセルに留まり続ける (cells[-1])
+        self.cells = [start_state >> 3]
+        self.outcome = None
+        # 結末が確定したステップ数 (ゴール到着 / 落下 / ループ検出)
+        self.end_step = 0
+        # ループの場合: 繰り返しが始まる時刻と周期
+        self.cycle_start = -1
+        self.cycle_length = 0
+
+        transitions = compiled.transitions
+        goal_cells = compiled.goal_cells
+        seen = {start_state: 0}
+        state = start_state
+
+        while not goal_cells[state >> 3]:
+            state = transitions[state]
+            if state < 0:
+                # 落下したステップで終了
+                self.outcome = OUTCOME_PIT if state == FATAL_PIT else OUTCOME_OUT
+                self.end_step = len(self.cells)
+                return
+
+            if state in seen:
+                # 以前の状態に戻ったステップで終了
+                self.outcome = OUTCOME_LOOP
+                self.cycle_start = seen[state]
+                self.cycle_length = len(self.cells) - seen[state]
+                self.end_step = len(self.cells)
+                return
+
+            seen[state] = len(self.cells)
+            self.cells.append(state >> 3)
+
+        # ゴールに着いたステップで終了
+        self.outcome = OUTCOME_GOAL
+        self.end_step = len(self.cells) - 1
+
+    @property
+    def reaches_goal(self):
+        return self.outcome == OUTCOME_GOAL
+
+    def cell_at(self, t):
+        """時刻 t のセル番号 (ゴール到着後はゴールのセル)"""
+        if t < len(self.cells):
+            return self.cells[t]
+        if self.outcome == OUTCOME_LOOP:
+            t = self.cycle_start + (t - self.cycle_start) % self.cycle_length
+            return self.cells[t]
+        return self.cells[-1]
+
+
+def trajectories_conflict(a, b):
+    """
+    ゴールに着く2つの軌跡が、Simulator.step の衝突規則でぶつかるかを判定する
+    (同じセルに入る / 位置を入れ替える)。
+    両方がゴールに着いた後は静止するため、遅い方の到着時刻まで調べれば十分。
+    """
+    cells_a = a.cells
+    cells_b = b.cells
+    last_a = len(cells_a) - 1
+    last_b = len(cells_b) - 1
+    horizon = max(last_a, last_b)
+
+    prev_a = cells_a[0]
+    prev_b = cells_b[0]
+    for t in range(1, horizon + 1):
+        cur_a = cells_a[t] if t <= last_a else cells_a[last_a]
+        cur_b = cells_b[t] if t <= last_b else cells_b[last_b]
+        if cur_a == cur_b:
+            return True
+        if cur_a == prev_b and cur_b == prev_a:
+            return True
+        prev_a = cur_a
+        prev_b = cur_b
+    return False
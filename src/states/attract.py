@@ -15,8 +15,10 @@ from src.const import (
     COLOR_WHITE,
     COLOR_GRAY,
     MOUSE_MOVE_THRESHOLD,
+    DEMO_TRACE_PATH,
 )
-from src.game.loader import StageLoader
+from src.game.loader import get_shared_loader
+from src.game.trace import load_traces
 from src.states.play import PlayState
 
 
@@ -31,7 +33,8 @@ class AttractState(State):
 
         # PlayStateをサブステートとして持つ（デモ再生用）
         self.play_state = PlayState(manager)
-        self.loader = StageLoader()
+        self.loader = get_shared_loader()
+        self.demo_traces = self._load_demo_traces()
 
         self.demo_wait_timer = 0
         self.is_waiting_next = False
@@ -54,6 +57,16 @@ class AttractState(State):
         self.voice_timer = 0
         self._start_new_demo()
 
+    def _load_demo_traces(self):
+        """デモ用トレースをステージのハッシュで引けるようにする (なければ毎回シミュレーション)"""
+        if not os.path.exists(DEMO_TRACE_PATH):
+            return {}
+        try:
+            return {trace.key: trace for trace in load_traces(DEMO_TRACE_PATH)}
+        except (OSError, ValueError) as e:
+            print(f"Error loading demo traces: {e}")
+            return {}
+
     def _start_new_demo(self):
         """新しいステージをランダムに選んでデモ開始"""
         levels = self.loader.get_available_levels()
@@ -64,9 +77,19 @@ class AttractState(State):
         level = random.choice(levels)
         try:
             stage_data = self.loader.load_stage(level)
+            # コンパイル済みデータ (あればハッシュと有効範囲を求め直さない)
+            artifact = self.loader.load_artifact(level)
+
+            # 記録済みのトレースがあれば、シミュレーションせずに再生する
+            trace = None
+            if self.demo_traces:
+                from src.game.stage_artifact import stage_key
+
+                key = artifact["key"] if artifact else stage_key(stage_data)
+                trace = self.demo_traces.get(key)
 
             # PlayStateにデモ設定をロードさせる
-            self.play_state.setup_demo(stage_data)
+            self.play_state.setup_demo(stage_data, trace=trace, artifact=artifact)
 
             self.is_waiting_next = False
             self.demo_wait_timer = 0
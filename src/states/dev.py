@@ -2,11 +2,17 @@ import pygame
 import json
 import os
 import datetime
+import threading
 import tkinter as tk
 from tkinter import filedialog
 from src.core.state_machine import State
 from src.ui.widgets import Button
 from src.game.map import TileMap
+from src.game.compiled_map import DIRECTIONS, build_warp_index, find_warp_problems
+from src.game.reachability import reachability_map, summarize
+from src.game.solver_cache import SolverCache, VERDICT_NO_SOLUTION, VERDICT_UNIQUE
+from src.game.tile_grid import CODE_PIT, intern_tile
+from src.game.trajectory import OUTCOME_GOAL, OUTCOME_LOOP
 from src.const import (
     SCREEN_WIDTH,
     SCREEN_HEIGHT,
@@ -116,6 +122,21 @@ class DevState(State):
             ]
             self.placed_players = []
 
+        # 解の検証 (別スレッドでソルバーを回し、メインループを止めない)
+        self.verify_thread = None
+        self.verify_cancel = None
+        # 進捗と結果は (開始時のトークン, 値) の形で受け取り、古い検証の結果を無視する
+        self.verify_progress = (None, 0, 0)  # (トークン, 調べ終えた配置数, 総数)
+        self.verify_result = None  # (トークン, 完了時のメッセージ)
+        self.solver_cache = SolverCache()
+
+        # 到達マップ (Hキーで向きを切り替えて重ねて表示。None なら非表示)
+        self.heatmap_direction = None
+        self.heatmap = None  # 編集のたびに捨て、次の描画で計算し直す
+        # 描画用: マスごとの (gx, gy, 色, ステップ数の文字の Surface)。到達マップと一緒に作る
+        self.heatmap_cells = []
+        self._heatmap_overlays = {}  # (色, タイルサイズ) -> 半透明の Surface
+
         # TileMapインスタンス
         self.tile_map = TileMap(self.map_data)
         self._refresh_tile_map()
@@ -134,6 +155,9 @@ class DevState(State):
 
     def _refresh_tile_map(self):
         """TileMapの再生成"""
+        # マップが変わったので実行中の検証と到達マップは無効
+        self._cancel_verify()
+        self.heatmap = None
         self.tile_map = TileMap(self.map_data)
         self.tile_map.placed_pieces = []
         for p in self.placed_players:
@@ -254,10 +278,77 @@ class DevState(State):
 
         self.manager.change_state(PlayState(self.manager, stage_data=stage_data))
 
+    def _on_verify(self):
+        """現在のマップとプレイヤーの向きで解を探索し、一意かどうかを調べる"""
+        if not self.placed_players:
+            self.message = "No players placed!"
+            return
+
+        self._cancel_verify()
+
+        # 編集中に書き換わらないよう、探索用にコピーを渡す
+        map_data = [row[:] for row in self.map_data]
+        templates = [{"direction": p["direction"]} for p in self.placed_players]
+        cancel = threading.Event()
+
+        self.verify_cancel = cancel
+        self.verify_progress = (cancel, 0, 0)
+        self.verify_result = None
+        self.verify_thread = threading.Thread(
+            target=self._verify_worker,
+            args=(map_data, templates, cancel),
+            daemon=True,
+        )
+        self.verify_thread.start()
+
+    def _verify_worker(self, map_data, templates, cancel):
+        """検証スレッド本体 (2つ目の解が見つかった時点で一意でないと判定して止める)"""
+
+        def on_progress(explored, total):
+            self.verify_progress = (cancel, explored, total)
+
+        try:
+            # 一度検証した盤面はディスクキャッシュから即座に返す
+            entry = self.solver_cache.check(
+                map_data, templates, limit=2, cancel=cancel, progress=on_progress
+            )
+            # ペアになっていないワープは解があっても警告する
+            problems = find_warp_problems(build_warp_index(map_data))
+        except Exception as e:
+            # 編集中の壊れたマップなどで失敗しても "Verifying..." のまま止めない
+            print(f"Verify failed: {e}")
+            self.verify_result = (cancel, f"Verify failed: {e}")
+            return
+
+        if entry is None or cancel.is_set():
+            return
+        if entry["verdict"] == VERDICT_NO_SOLUTION:
+            message = "Verify: No solution."
+        elif entry["verdict"] == VERDICT_UNIQUE:
+            message = "Verify: Unique solution!"
+        else:
+            message = "Verify: Multiple solutions."
+
+        if problems:
+            message += " Unpaired warp: " + ", ".join(
+                f"{warp_id} x{count}" for warp_id, count in problems
+            )
+        self.verify_result = (cancel, message)
+
+    def _cancel_verify(self):
+        if self.verify_cancel:
+            self.verify_cancel.set()
+        self.verify_thread = None
+        self.verify_cancel = None
+
     def enter(self):
         print("Dev Mode Entered")
         pygame.key.set_repeat(200, 50)
 
+    def exit(self):
+        self._cancel_verify()
+        self.leave()
+
     def leave(self):
         pygame.key.set_repeat()
 
@@ -319,6 +410,59 @@ class DevState(State):
                 from src.states.attract import AttractState
 
                 self.manager.change_state(AttractState(self.manager))
+            elif event.key == pygame.K_v:
+                self._on_verify()
+            elif event.key == pygame.K_h:
+                self._toggle_heatmap()
+
+    def _toggle_heatmap(self):
+        """到達マップの向きを 非表示 -> up -> down -> left -> right -> 非表示 の順に切り替える"""
+        order = (None,) + DIRECTIONS
+        index = order.index(self.heatmap_direction)
+        self.heatmap_direction = order[(index + 1) % len(order)]
+        self.heatmap = None
+        if self.heatmap_direction is None:
+            self.message = "Heatmap: off"
+            return
+
+        counts = summarize(self._get_heatmap())
+        summary = " / ".join(f"{k} {v}" for k, v in counts.items())
+        self.message = f"Heatmap ({self.heatmap_direction}): {summary}"
+
+    def _get_heatmap(self):
+        if self.heatmap is None:
+            self.heatmap = reachability_map(self.map_data, self.heatmap_direction)
+            # 文字の描画は重いため、毎フレームではなく到達マップを作った時に1回だけ行う
+            self.heatmap_cells = []
+            for gy, row in enumerate(self.heatmap):
+                for gx, cell in enumerate(row):
+                    if cell is None:
+                        continue
+                    outcome, steps = cell
+                    if outcome == OUTCOME_GOAL:
+                        color = (0, 255, 0, 110)
+                    elif outcome == OUTCOME_LOOP:
+                        color = (255, 255, 0, 110)
+                    else:
+                        color = (255, 0, 0, 110)
+                    label = self.small_font.render(str(steps), True, COLOR_WHITE)
+                    self.heatmap_cells.append((gx, gy, color, label))
+        return self.heatmap
+
+    def _draw_heatmap(self, surface, offset_x, offset_y):
+        """通常マスごとに、1人で置いた場合の結末を色、ステップ数を数字で重ねる"""
+        self._get_heatmap()
+        size = self.tile_map.tile_size
+        for gx, gy, color, label in self.heatmap_cells:
+            overlay = self._heatmap_overlays.get((color, size))
+            if overlay is None:
+                overlay = pygame.Surface((size, size), pygame.SRCALPHA)
+                overlay.fill(color)
+                self._heatmap_overlays[(color, size)] = overlay
+            x = offset_x + gx * size
+            y = offset_y + gy * size
+            surface.blit(overlay, (x, y))
+            surface.blit(label, label.get_rect(center=(x + size // 2, y + size // 2)))
 
     def _apply_brush(self, gx, gy, button):
         if button != 1:
@@ -326,15 +470,17 @@ class DevState(State):
 
         tile_changed = False
 
+        # 判定は TileMap のタイルコードで行い、保存用の map_data には文字列のIDを書く
+        grid = self.tile_map.grid
         if self.current_brush["type"] == "tile":
-            current_val = self.map_data[gy][gx]
             new_val = self.current_brush["value"]
+            new_code = intern_tile(new_val)
 
-            if current_val != new_val:
+            if grid.code_at(gx, gy) != new_code:
                 self.map_data[gy][gx] = new_val
                 # タイルが変わったらその上のプレイヤー削除 (Wall/Pit/Loop対策など、基本は置いたタイルの整合性を取る)
                 # 特にNULL/PITにした場合はプレイヤー落とす
-                if new_val == TILE_PIT:
+                if new_code == CODE_PIT:
                     self.placed_players = [
                         p
                         for p in self.placed_players
@@ -362,7 +508,7 @@ class DevState(State):
                     {"grid_x": gx, "grid_y": gy, "direction": direction}
                 )
                 # その下のタイルをNormalにする
-                if self.map_data[gy][gx] == TILE_PIT:
+                if grid.code_at(gx, gy) == CODE_PIT:
                     self.map_data[gy][gx] = TILE_NORMAL
                 tile_changed = True
 
@@ -370,6 +516,18 @@ class DevState(State):
             self._refresh_tile_map()
 
     def update(self, dt):
+        # 検証の進捗・結果をメッセージに反映
+        if self.verify_thread:
+            token = self.verify_cancel
+            if self.verify_result and self.verify_result[0] is token:
+                self.message = self.verify_result[1]
+                self.verify_thread = None
+                self.verify_cancel = None
+            elif self.verify_progress[0] is token:
+                _, explored, total = self.verify_progress
+                percent = explored * 100 // total if total else 0
+                self.message = f"Verifying... {percent}%"
+
         if self.message_timer > 0:
             self.message_timer -= 1
             if self.message_timer <= 0:
@@ -453,6 +611,10 @@ class DevState(State):
         )
 
         self.tile_map.draw(surface, offset_x, offset_y)
+        if self.heatmap_direction is not None:
+            self._draw_heatmap(surface, offset_x, offset_y)
 
-        guide = self.small_font.render("Press 'D' to Quit", True, (100, 100, 100))
+        guide = self.small_font.render(
+            "Press 'V' to Verify / 'H' for Heatmap / 'D' to Quit", True, (100, 100, 100)
+        )
         surface.blit(guide, (20, SCREEN_HEIGHT - 20))
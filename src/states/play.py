@@ -17,12 +17,14 @@ from src.const import (
     SIM_STEP_DELAY,
     SIM_ANIM_DURATION,
     INVENTORY_WIDTH,
-    SIMULATION_TIMEOUT,
+    SIM_SPEEDS,
 )
-from src.game.loader import StageLoader
+from src.game.loader import get_shared_loader
 from src.game.map import TileMap
 from src.game.inventory import Inventory
-from src.game.simulator import Simulator
+from src.game.playback import Playback, REASON_LOOP
+from src.game.compiled_map import CompiledMap
+from src.game.prefetch import StagePrefetcher, prepare_stage
 
 
 class PlayState(State):
@@ -39,7 +41,8 @@ class PlayState(State):
         self.last_mouse_pos = None
 
         # ゲームコンポーネント
-        self.loader = StageLoader()
+        self.loader = get_shared_loader()
+        self.prefetcher = StagePrefetcher(self.loader)
         self.tile_map = None
         self.inventory = None
         self.current_level = 1
@@ -55,10 +58,17 @@ class PlayState(State):
 
         # シミュレーション用
         self.game_state = GAME_STATE_PLACING
-        self.simulator = None
+        self.playback = None  # 決着まで前計算したシミュレーションの録画
+        self.compiled_map = None  # 現在のステージの遷移表 (ステージごとに1回だけ作成)
+        self.sim_step = 0  # 表示中のステップ (録画の添字)
         self.sim_timer = 0
+        self.sim_speed = SIM_SPEEDS[0]  # 再生速度の倍率
         self.sim_last_result = "CONTINUE"
-        self.prev_player_positions = []  # アニメーション用: 各プレイヤーの移動前座標 [{"x": int, "y": int}]
+
+        # リトライ用: ステージを読み直さずに戻せるよう、配置前の状態を覚えておく
+        self.initial_pieces = []
+        self.initial_inventory = []
+        self.initial_auto_play = False
 
         # ガイド用
         self.show_guide = False
@@ -72,6 +82,7 @@ class PlayState(State):
         self.demo_phase = "IDLE"
         self.demo_timer = 0
         self.demo_wait_timer = 0  # デモ用ウェイト
+        self.demo_trace = None  # デモで再生するトレース (なければシミュレーションする)
 
     def enter(self):
         print("プレイモードに遷移しました")
@@ -81,7 +92,7 @@ class PlayState(State):
         self.is_dragging = False
 
         self.game_state = GAME_STATE_PLACING
-        self.simulator = None
+        self.playback = None
         self.sim_timer = 0
         self.result_timer = 0  # 初期化
 
@@ -116,6 +127,7 @@ class PlayState(State):
                     # auto_playフラグがあればシミュレーション開始
                     if stage_data.get("auto_play", False):
                         print("Auto-playing answer...")
+                        self._remember_setup(auto_play=True)
                         self._start_simulation()
                     else:
                         # 手動プレイ（配置状態からスタート）
@@ -126,27 +138,72 @@ class PlayState(State):
                     self.inventory = Inventory(stage_data["players"][:])
 
             else:
-                stage_data = self.loader.load_stage(self.current_level)
-                self.tile_map = TileMap(stage_data["map_data"])
-
-                # 自動リサイズ
-                play_area_w = SCREEN_WIDTH - INVENTORY_WIDTH
-                play_area_h = SCREEN_HEIGHT - 100
-                self.tile_map.fit_to_area(play_area_w, play_area_h)
-
-                self.inventory = Inventory(stage_data["players"][:])
-                # インベントリサイズもマップに合わせる
-                self.inventory.set_tile_size(self.tile_map.tile_size, INVENTORY_WIDTH)
+                # 先読みが済んでいれば差し替えるだけ (間に合わなければここで読み込む)
+                # 読み込み・自動リサイズ・インベントリのサイズ合わせ・遷移表の作成まで済んでいる
+                prepared = self.prefetcher.take(self.current_level)
+                if prepared is None:
+                    prepared = prepare_stage(self.loader, self.current_level)
+                self.tile_map = prepared.tile_map
+                self.inventory = prepared.inventory
+                self.compiled_map = prepared.compiled
 
                 if self.current_level == 1:
                     self.show_guide = True
 
+                # クリア時にすぐ切り替えられるよう、次のステージを先読みしておく
+                next_level = self.current_level + 1
+                if next_level in self.loader.get_available_levels():
+                    self.prefetcher.start(next_level)
+
+            if self.game_state == GAME_STATE_PLACING:
+                self._remember_setup()
+
         except Exception as e:
             print(f"Error loading stage {self.current_level}: {e}")
 
-    def setup_demo(self, stage_data):
-        """デモモード用にステージをロードして初期化"""
+    def _remember_setup(self, auto_play=False):
+        """配置前の盤面とインベントリを覚えておく (リトライ時に使う)"""
+        self.initial_pieces = [dict(p) for p in self.tile_map.placed_pieces]
+        self.initial_inventory = list(self.inventory.players_data)
+        self.initial_auto_play = auto_play
+
+    def _retry(self):
+        """ステージを読み直さずに、配置前の状態からやり直す"""
+        self.inactivity_timer = 0
+        self.held_piece = None
+        self.is_dragging = False
+
+        self.game_state = GAME_STATE_PLACING
+        self.playback = None
+        self.sim_timer = 0
+        self.result_timer = 0
+
+        # Simulator は配置を書き換えないため、覚えておいた配置をそのまま戻せる
+        self.tile_map.placed_pieces = [dict(p) for p in self.initial_pieces]
+        self.inventory.players_data = list(self.initial_inventory)
+        if self.initial_auto_play:
+            self._start_simulation()
+
+    def setup_demo(self, stage_data, trace=None, artifact=None):
+        """
+        デモモード用にステージをロードして初期化
+        Args:
+            stage_data: ステージデータ
+            trace: 再生するトレース (src.game.trace.Trace)。
+                   指定するとトレースの初期配置に駒を置き、シミュレーションせずに記録を再生する
+            artifact: ステージのコンパイル済みデータ (StageLoader.load_artifact)。
+                      あればハッシュと有効範囲を求め直さない
+        """
+        if trace is not None:
+            from src.game.stage_artifact import stage_key
+
+            key = artifact["key"] if artifact else stage_key(stage_data)
+            if trace.key != key:
+                print("Trace does not match the stage. Simulating instead.")
+                trace = None
+
         self.is_demo = True
+        self.demo_trace = trace
         self.custom_stage_data = stage_data
         self.current_level = 0  # 無視されるが念のため
 
@@ -155,7 +212,7 @@ class PlayState(State):
         self.last_mouse_pos = pygame.mouse.get_pos()
         self.held_piece = None
         self.game_state = GAME_STATE_PLACING
-        self.simulator = None
+        self.playback = None
         self.sim_timer = 0
         self.result_timer = 0  # 初期化
         self.show_guide = False  # デモ中ガイドは不要
@@ -167,7 +224,11 @@ class PlayState(State):
             # 自動リサイズ
             play_area_w = SCREEN_WIDTH - INVENTORY_WIDTH
             play_area_h = SCREEN_HEIGHT - 100
-            self.tile_map.fit_to_area(play_area_w, play_area_h)
+            self.tile_map.fit_to_area(
+                play_area_w,
+                play_area_h,
+                bounds=artifact["content_bounds"] if artifact else None,
+            )
 
             self.inventory = Inventory(stage_data["players"][:])
             # インベントリサイズもマップに合わせる
@@ -216,6 +277,24 @@ class PlayState(State):
 
         # 'D'キーで開発者モードへ
         if event.type == pygame.KEYDOWN:
+            # 左キーでシミュレーションを1ステップ巻き戻す (結果表示中は除く)
+            if (
+                event.key == pygame.K_LEFT
+                and self.game_state == GAME_STATE_SIMULATING
+                and self.result_timer == 0
+                and self.sim_step > 0
+            ):
+                self.inactivity_timer = 0
+                self.sim_step -= 1
+                self.sim_last_result = self.playback.status_at(self.sim_step)
+                self.sim_timer = 0
+
+            # 右キーでシミュレーションの再生速度を切り替える
+            if event.key == pygame.K_RIGHT and self.game_state == GAME_STATE_SIMULATING:
+                self.inactivity_timer = 0
+                index = SIM_SPEEDS.index(self.sim_speed)
+                self.sim_speed = SIM_SPEEDS[(index + 1) % len(SIM_SPEEDS)]
+
             if event.key == pygame.K_d:
                 from src.states.dev import DevState
 
@@ -260,17 +339,29 @@ class PlayState(State):
             self.held_piece = None
             self.is_dragging = False
 
-    def _start_simulation(self):
+    def _start_simulation(self, playback=None):
+        """
+        シミュレーションを開始する
+        Args:
+            playback: 再生する録画 (Playback / Trace)。省略時は現在の配置から計算する
+        """
         print("Start Simulation")
         self.game_state = GAME_STATE_SIMULATING
-        self.simulator = Simulator(self.tile_map.map_data, self.tile_map.placed_pieces)
+
+        if playback is None:
+            # 遷移表は同じマップなら使い回す
+            map_data = self.tile_map.map_data
+            if self.compiled_map is None or self.compiled_map.map_data is not map_data:
+                self.compiled_map = CompiledMap(map_data)
+
+            # 決着 (クリア / 落下・衝突 / 無限ループ) まで先に計算し、以後は録画を再生する
+            playback = Playback(
+                map_data, self.tile_map.placed_pieces, compiled=self.compiled_map
+            )
+        self.playback = playback
+        self.sim_step = 0
         self.sim_timer = SIM_STEP_DELAY  # 即座に最初のステップを実行させるため
-        self.sim_elapsed_time = 0
         self.sim_last_result = "CONTINUE"
-        # 初期座標を記録
-        self.prev_player_positions = [
-            {"x": p["grid_x"], "y": p["grid_y"]} for p in self.tile_map.placed_pieces
-        ]
 
     def _update_demo(self, dt):
         """デモモードの更新処理"""
@@ -281,14 +372,20 @@ class PlayState(State):
             if self.inventory and len(self.inventory.players_data) > 0:
                 if self.demo_timer >= place_interval:
                     piece_data = self.inventory.players_data[0]
-                    if "answer" in piece_data:
+                    if self.demo_trace is not None:
+                        # トレースの初期配置 (駒の順番はステージと同じ)
+                        index = len(self.tile_map.placed_pieces)
+                        x, y = self.demo_trace.position(0, index)
+                        piece = {"direction": piece_data["direction"]}
+                        self.tile_map.place_piece(x, y, piece)
+                    elif "answer" in piece_data:
                         ans = piece_data["answer"]
                         piece = {"direction": piece_data["direction"]}
                         self.tile_map.place_piece(ans["x"], ans["y"], piece)
                     self.inventory.remove_piece(piece_data)
                     self.demo_timer = 0
             else:
-                self._start_simulation()
+                self._start_simulation(playback=self.demo_trace)
                 self.demo_phase = "SIMULATING"
 
         elif self.demo_phase == "SIMULATING":
@@ -299,11 +396,8 @@ class PlayState(State):
                     return  # 終了
 
                 self.sim_timer = 0
-                self.prev_player_positions = [
-                    {"x": p["grid_x"], "y": p["grid_y"]}
-                    for p in self.tile_map.placed_pieces
-                ]
-                self.sim_last_result = self.simulator.step()
+                self.sim_step += 1
+                self.sim_last_result = self.playback.status_at(self.sim_step)
 
     def update(self, dt):
         if self.is_demo:
@@ -312,7 +406,9 @@ class PlayState(State):
 
         # フレームごとに無操作タイマーを加算
         # handle_eventでリセットされない限り加算され続ける
-        self.inactivity_timer += dt
+        # (シミュレーションの再生中は見ているだけなので数えない。再生は決着まで有限の長さ)
+        if self.game_state != GAME_STATE_SIMULATING:
+            self.inactivity_timer += dt
 
         if self.inactivity_timer >= PLAY_TIMEOUT:
             from src.states.confirm import ConfirmContinueState
@@ -325,17 +421,11 @@ class PlayState(State):
 
         # シミュレーション更新
         if self.game_state == GAME_STATE_SIMULATING:
-            self.sim_timer += dt
-            self.sim_elapsed_time += dt
-
-            # タイムアウトチェック
-            if (
-                self.sim_elapsed_time >= SIMULATION_TIMEOUT
-                and self.sim_last_result == "CONTINUE"
-            ):
-                print("Simulation Timed Out! Force LOSE.")
-                self.sim_last_result = "LOSE"
-                self.sim_timer = SIM_STEP_DELAY  # 強制的に結果処理へ
+            # 結果表示中は倍速にしない
+            if self.sim_last_result == "CONTINUE":
+                self.sim_timer += dt * self.sim_speed
+            else:
+                self.sim_timer += dt
 
             if self.sim_timer >= SIM_STEP_DELAY:
                 # 前回の結果判定をここで行う（アニメーション終了後）
@@ -410,20 +500,18 @@ class PlayState(State):
                         else:
                             # リトライ（ライフ維持）
                             print("Resetting for retry...")
-                            self.enter()
+                            self._retry()
                             return
 
-                # 次のステップへ
+                # 次のステップへ (決着は録画の最後のステップで判明する)
                 self.sim_timer = 0
-
-                # 現在位置を「前回位置」として保存
-                self.prev_player_positions = [
-                    {"x": p["grid_x"], "y": p["grid_y"]}
-                    for p in self.tile_map.placed_pieces
-                ]
-
-                # シミュレーション実行 (座標が更新される)
-                self.sim_last_result = self.simulator.step()
+                self.sim_step += 1
+                self.sim_last_result = self.playback.status_at(self.sim_step)
+                if (
+                    self.sim_last_result == "LOSE"
+                    and self.playback.reason == REASON_LOOP
+                ):
+                    print("Simulation loops forever. Force LOSE.")
 
     def draw(self, surface):
         if self.manager.app.bg_image:
@@ -469,43 +557,42 @@ class PlayState(State):
                 # 0~1の進行度を4フレームにマッピング (0, 1, 2, 3)
                 frame_index = int(t * 4) % 4
 
-                for i, p in enumerate(self.tile_map.placed_pieces):
-                    if i < len(self.prev_player_positions):
-                        # 最新座標 (grid)
-                        curr_gx, curr_gy = p["grid_x"], p["grid_y"]
-                        # 前回座標
-                        prev_pos = self.prev_player_positions[i]
-                        prev_gx, prev_gy = prev_pos["x"], prev_pos["y"]
-
-                        # 補間座標 (grid単位) - 等速
-                        lerp_gx = prev_gx + (curr_gx - prev_gx) * t
-                        lerp_gy = prev_gy + (curr_gy - prev_gy) * t
-
-                        # 画面座標変換
-                        screen_x = map_x + lerp_gx * self.tile_map.tile_size
-                        screen_y = map_y + lerp_gy * self.tile_map.tile_size
-
-                        # 画像取得 (TileMapの新しいplayer_imagesを使用)
-                        direction = p["piece"]["direction"]
-                        # 方向に対応するフレームリストを取得
-                        frames = self.tile_map.player_images.get(direction)
-                        if frames and len(frames) > 0:
-                            # フレーム数が4未満の場合の安全策
-                            safe_frame_index = frame_index % len(frames)
-                            img = frames[safe_frame_index]
-                            surface.blit(img, (screen_x, screen_y))
-                        else:
-                            # 万が一画像がない場合は矩形で描画 (デバッグ用)
-                            pygame.draw.rect(
-                                surface,
-                                (255, 0, 0),
-                                (
-                                    screen_x,
-                                    screen_y,
-                                    self.tile_map.tile_size,
-                                    self.tile_map.tile_size,
-                                ),
-                            )
+                # 録画の前のステップから表示中のステップへ補間する
+                # (ステップ 0 では前のステップも開始位置になる)
+                playback = self.playback
+                for i in range(playback.num_players):
+                    curr_gx, curr_gy = playback.position(self.sim_step, i)
+                    prev_gx, prev_gy = playback.position(self.sim_step - 1, i)
+
+                    # 補間座標 (grid単位) - 等速
+                    lerp_gx = prev_gx + (curr_gx - prev_gx) * t
+                    lerp_gy = prev_gy + (curr_gy - prev_gy) * t
+
+                    # 画面座標変換
+                    screen_x = map_x + lerp_gx * self.tile_map.tile_size
+                    screen_y = map_y + lerp_gy * self.tile_map.tile_size
+
+                    # 画像取得 (TileMapの新しいplayer_imagesを使用)
+                    direction = playback.direction(self.sim_step, i)
+                    # 方向に対応するフレームリストを取得
+                    frames = self.tile_map.player_images.get(direction)
+                    if frames and len(frames) > 0:
+                        # フレーム数が4未満の場合の安全策
+                        safe_frame_index = frame_index % len(frames)
+                        img = frames[safe_frame_index]
+                        surface.blit(img, (screen_x, screen_y))
+                    else:
+                        # 万が一画像がない場合は矩形で描画 (デバッグ用)
+                        pygame.draw.rect(
+                            surface,
+                            (255, 0, 0),
+                            (
+                                screen_x,
+                                screen_y,
+                                self.tile_map.tile_size,
+                                self.tile_map.tile_size,
+                            ),
+                        )
 
             # インベントリ領域の計算 (画面右端)
             inventory_rect = pygame.Rect(
@@ -0,0 +1,55 @@
+# d:/game/puzzle/tests/test_bundle.py
+# ステージのバンドルファイルのテスト
+# stages/ の全ステージをバンドルに書き出して復号し、元の JSON と一致することを確かめる
+# RELEVANT FILES: src/game/bundle.py, src/game/loader.py, stages/
+
+import json
+import os
+
+import pytest
+
+from src.game.bundle import StageBundle, write_bundle
+
+STAGES_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "stages")
+
+
+def load_json_stages():
+    stages = {}
+    for filename in os.listdir(STAGES_DIR):
+        level, ext = os.path.splitext(filename)
+        if ext == ".json" and level.isdigit():
+            with open(os.path.join(STAGES_DIR, filename), "r", encoding="utf-8") as f:
+                stages[int(level)] = json.load(f)
+    return stages
+
+
+def test_bundle_round_trips_every_stage(tmp_path):
+    stages = load_json_stages()
+    assert stages
+    path = str(tmp_path / "stages.bundle")
+    write_bundle(path, stages)
+
+    bundle = StageBundle(path)
+    try:
+        assert bundle.levels() == sorted(stages)
+        for level, data in stages.items():
+            assert bundle.decode(level) == data, f"level {level}"
+    finally:
+        bundle.close()
+
+
+@pytest.mark.parametrize(
+    "edit",
+    [
+        lambda stage: stage.update(title="extra"),
+        lambda stage: stage["players"][0].update(color="red"),
+        lambda stage: stage["players"][0]["answer"].update(z=0),
+    ],
+)
+def test_write_bundle_rejects_keys_it_cannot_store(tmp_path, edit):
+    stage = load_json_stages()[1]
+    edit(stage)
+    path = tmp_path / "stages.bundle"
+    with pytest.raises(ValueError):
+        write_bundle(str(path), {1: stage})
+    assert not path.exists()
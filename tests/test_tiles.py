@@ -0,0 +1,58 @@
+# d:/game/puzzle/tests/test_tiles.py
+# タイルの規則の登録表のテスト
+# 入る向きで扱いが変わるタイル (一方通行の扉) を登録するだけで、CompiledMap を変えずに遷移表へ反映されることを確かめる
+# RELEVANT FILES: src/game/tiles.py, src/game/compiled_map.py, src/game/simulator.py
+
+from src.const import TILE_GOAL, TILE_NORMAL
+from src.game.compiled_map import CompiledMap
+from src.game.simulator import Simulator
+from src.game.tiles import (
+    ENTER_BLOCKED,
+    ENTER_OK,
+    TileRule,
+    register_tile,
+)
+
+# 右向きに進む駒だけが通れる扉 (enter は 上, 下, 左, 右 の順)
+TILE_ONE_WAY_RIGHT = "09901"
+KIND_ONE_WAY_RIGHT = register_tile(
+    TileRule(
+        "one_way_right", enter=(ENTER_BLOCKED, ENTER_BLOCKED, ENTER_BLOCKED, ENTER_OK)
+    ),
+    [TILE_ONE_WAY_RIGHT],
+)
+
+
+def test_uniform_enter_is_expanded_per_direction():
+    rule = TileRule("wall", enter=ENTER_BLOCKED)
+    assert rule.enter == (ENTER_BLOCKED,) * 4
+
+
+def test_one_way_door_passes_in_its_direction():
+    map_data = [[TILE_NORMAL, TILE_ONE_WAY_RIGHT, TILE_NORMAL, TILE_GOAL]]
+    sim = Simulator(
+        map_data, [{"grid_x": 0, "grid_y": 0, "piece": {"direction": "right"}}]
+    )
+    assert sim.run(10) == "WIN"
+
+
+def test_one_way_door_blocks_the_other_directions():
+    map_data = [
+        [TILE_GOAL, TILE_ONE_WAY_RIGHT, TILE_NORMAL],
+        [TILE_NORMAL, TILE_NORMAL, TILE_NORMAL],
+    ]
+    compiled = CompiledMap(map_data)
+    door = compiled.cell_of(1, 0)
+    # 左向き (右から) と上向き (下から) は扉の手前で止まる
+    left = compiled.pack(2, 0, "left")
+    up = compiled.pack(1, 1, "up")
+    assert compiled.step(left) >> 3 == compiled.cell_of(2, 0)
+    assert compiled.step(up) >> 3 == compiled.cell_of(1, 1)
+    # 扉の上からは通常どおり進める
+    assert compiled.step(compiled.pack(1, 0, "left")) >> 3 == compiled.cell_of(0, 0)
+    assert door not in {compiled.step(left) >> 3, compiled.step(up) >> 3}
+
+    sim = Simulator(
+        map_data, [{"grid_x": 2, "grid_y": 0, "piece": {"direction": "left"}}]
+    )
+    assert sim.run(10) != "WIN"